@@ -1,7 +1,8 @@
 from flask.json import jsonify
 from constants.http_status_code import HTTP_404_NOT_FOUND, HTTP_500_INTERNAL_SERVER_ERROR
-from flask import Flask, config, redirect
+from flask import Flask, config, redirect, g, request, Response
 import os
+import time
 from flask_jwt_extended import JWTManager
 from flasgger import Swagger, swag_from
 from config.swagger import template, swagger_config
@@ -13,6 +14,13 @@ from dotenv import load_dotenv
 from controller.users import users
 from controller.sets import sets
 from controller.questions import questions
+from controller.answer import answers
+from controller.health import health
+from controller.quizzes import quizzes
+from utils.database import init_app as init_db, pool
+from utils.metrics import metrics
+from utils.json_provider import FastJSONProvider
+from utils.compression import init_app as init_compression
 
 # Tải các biến môi trường từ file .env
 load_dotenv()
@@ -27,6 +35,9 @@ app.config.from_mapping(
             }
         )
 
+# jsonify dùng orjson nếu có (UUID, datetime được serialize trực tiếp)
+app.json = FastJSONProvider(app)
+
 ma.app=app
 ma.init_app(app)
 JWTManager(app)
@@ -35,9 +46,50 @@ CORS(app)
 app.register_blueprint(users)
 app.register_blueprint(sets)
 app.register_blueprint(questions)
+app.register_blueprint(answers)
+app.register_blueprint(health)
+app.register_blueprint(quizzes)
+
+# Pool kết nối database, mỗi request dùng một kết nối
+init_db(app)
 
 Swagger(app, config=swagger_config, template=template)
 
+# Nén gzip / brotli cho JSON lớn (after_request)
+init_compression(app)
+
+@app.before_request
+def start_request_timer():
+    # Thời điểm bắt đầu request, dùng để tính latency trong log và metrics
+    g.request_started_at = time.perf_counter()
+    metrics.request_started()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started_at' in g:
+        queries, db_seconds, connections_opened = g.get('db_stats', (0, 0.0, 0))
+        metrics.request_finished(
+            request.blueprint or 'app',
+            request.endpoint or 'unknown',
+            request.method,
+            response.status_code,
+            time.perf_counter() - g.request_started_at,
+            queries,
+            db_seconds,
+            connections_opened
+        )
+    return response
+
+@app.get("/metrics")
+def get_metrics():
+    pool_stats = pool.stats()
+    gauges = {
+        'db_pool_size': pool_stats['size'],
+        'db_pool_in_use': pool_stats['in_use'],
+        'db_pool_waiting': pool_stats['waiting']
+    }
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 @app.errorhandler(Exception)
 def handle_error(e):
     code = 500
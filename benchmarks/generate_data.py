@@ -0,0 +1,299 @@
+"""Synthetic dataset generator for scale testing.
+
+Generates users, sets, questions and answers that pass
+utils.validators.validate_question_and_answers and loads them with COPY from
+several worker processes. Each worker owns a range of users and writes them
+together with their sets, questions and answers in one transaction per chunk,
+so foreign keys hold without any ordering between workers.
+
+    python -m benchmarks.generate_data --users 200000 --sets-per-user poisson:4 \\
+        --questions-per-set uniform:10:60 --answers-per-question uniform:2:6 \\
+        --deleted-ratio 0.03 --workers 8
+
+Distributions are written as fixed:N, uniform:LOW:HIGH, poisson:MEAN or
+zipf:S:MAX. The same --seed and --chunk-users give the same rows whatever
+the number of workers (created_at is relative to the day of the run). Use --output-dir to write the COPY files instead of
+loading them.
+"""
+import argparse
+import bisect
+import datetime
+import io
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet',
+         'kilo', 'lima', 'mike', 'november', 'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango',
+         'uniform', 'victor', 'whiskey', 'xray', 'yankee', 'zulu', 'hoc', 'bai', 'cau', 'hoi')
+
+QUESTION_TYPES = ('Text_Fill', 'Multiple_Choice', 'Checkboxes')
+
+# Số đáp án tối thiểu của từng loại câu hỏi (xem validate_question_and_answers)
+MIN_ANSWERS = {'Text_Fill': 1, 'Multiple_Choice': 2, 'Checkboxes': 3}
+
+TABLES = (
+    ('user', 'public."user" (id, name, email, password, role, created_at, updated_at, is_deleted)'),
+    ('set', 'public.set (id, user_id, created_at, updated_at, is_deleted, public_or_not, name, description)'),
+    ('question', 'public.question (id, content, type, set_id, created_at, updated_at, is_deleted)'),
+    ('answer', 'public.answer (id, content, is_correct, question_id, created_at, updated_at, is_deleted)'),
+)
+
+class Distribution():
+    """Integer distribution parsed from fixed:N, uniform:LOW:HIGH, poisson:MEAN or zipf:S:MAX.
+
+    Only plain values are stored so that it can be sent to the worker processes.
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.kind, *values = spec.split(':')
+        try:
+            self.numbers = [float(value) for value in values]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'Invalid distribution {spec!r}')
+
+        arity = {'fixed': 1, 'uniform': 2, 'poisson': 1, 'zipf': 2}
+        if arity.get(self.kind) != len(self.numbers):
+            raise argparse.ArgumentTypeError(f'Invalid distribution {spec!r}')
+
+        self.cumulative = None
+        if self.kind == 'zipf':
+            # Bounded zipf over 1..MAX through its cumulative distribution
+            exponent, maximum = self.numbers[0], int(self.numbers[1])
+            weights = [1 / (rank ** exponent) for rank in range(1, maximum + 1)]
+            total = sum(weights)
+            self.cumulative = list(itertools.accumulate(weight / total for weight in weights))
+
+    @staticmethod
+    def _poisson(rng, mean):
+        if mean > 30:
+            # Normal approximation, Knuth's method is too slow for large means
+            return int(round(rng.gauss(mean, math.sqrt(mean))))
+        limit = math.exp(-mean)
+        count = 0
+        product = rng.random()
+        while product > limit:
+            count += 1
+            product *= rng.random()
+        return count
+
+    def sample(self, rng):
+        if self.kind == 'fixed':
+            value = int(self.numbers[0])
+        elif self.kind == 'uniform':
+            value = rng.randint(int(self.numbers[0]), int(self.numbers[1]))
+        elif self.kind == 'poisson':
+            value = self._poisson(rng, self.numbers[0])
+        else:
+            value = min(bisect.bisect_left(self.cumulative, rng.random()), len(self.cumulative) - 1) + 1
+        return max(0, value)
+
+def parse_weights(spec):
+    """Question type weights, e.g. Text_Fill=1,Multiple_Choice=2,Checkboxes=1."""
+    weights = dict.fromkeys(QUESTION_TYPES, 0.0)
+    for item in spec.split(','):
+        name, _, value = item.partition('=')
+        if name not in weights:
+            raise argparse.ArgumentTypeError(f'Unknown question type {name!r}')
+        weights[name] = float(value)
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError('At least one question type needs a positive weight')
+    return [weights[name] for name in QUESTION_TYPES]
+
+def copy_value(value):
+    """One field of the COPY text format."""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        text = text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+def write_row(buffer, row):
+    buffer.write('\t'.join(copy_value(value) for value in row))
+    buffer.write('\n')
+
+def answers_for(rng, question_type, count):
+    """is_correct flags that satisfy the rules of the question type."""
+    if question_type == 'Text_Fill':
+        return [True]
+    count = max(count, MIN_ANSWERS[question_type])
+    if question_type == 'Multiple_Choice':
+        correct = {rng.randrange(count)}
+    else:
+        # Checkboxes: at least two correct answers and at least one wrong answer
+        correct = set(rng.sample(range(count), rng.randint(2, count - 1)))
+    return [index in correct for index in range(count)]
+
+def generate_chunk(options, chunk_index, first_user, last_user):
+    """COPY buffers of users [first_user, last_user), with all of their sets, questions and answers."""
+    # Mỗi chunk có random riêng nên kết quả không phụ thuộc số worker
+    rng = random.Random(f'{options["seed"]}-{chunk_index}')
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    words = lambda count: ' '.join(rng.choice(WORDS) for _ in range(count))
+
+    buffers = {name: io.StringIO() for name, _ in TABLES}
+    counts = dict.fromkeys(buffers, 0)
+    deleted_ratio = options['deleted_ratio']
+    start = options['start_time']
+    span = options['days'] * 86400
+
+    for user_index in range(first_user, last_user):
+        user_id = new_id()
+        user_created = start + datetime.timedelta(seconds=rng.random() * span)
+        write_row(buffers['user'], (user_id, f'User {user_index}', f'user{user_index}@{options["email_domain"]}',
+                                    options['password_hash'], options['role'], user_created, user_created,
+                                    rng.random() < deleted_ratio))
+        counts['user'] += 1
+
+        for _ in range(options['sets_per_user'].sample(rng)):
+            set_id = new_id()
+            set_created = user_created + datetime.timedelta(seconds=rng.random() * 86400)
+            write_row(buffers['set'], (set_id, user_id, set_created, set_created, rng.random() < deleted_ratio,
+                                       rng.random() < 0.5, words(3).capitalize(), words(8)))
+            counts['set'] += 1
+
+            for question_number in range(options['questions_per_set'].sample(rng)):
+                question_id = new_id()
+                question_type = rng.choices(QUESTION_TYPES, options['type_weights'])[0]
+                question_created = set_created + datetime.timedelta(milliseconds=question_number)
+                write_row(buffers['question'], (question_id, words(rng.randint(5, 15)).capitalize() + '?', question_type,
+                                                set_id, question_created, question_created, rng.random() < deleted_ratio))
+                counts['question'] += 1
+
+                flags = answers_for(rng, question_type, options['answers_per_question'].sample(rng))
+                for answer_number, is_correct in enumerate(flags):
+                    answer_created = question_created + datetime.timedelta(microseconds=answer_number)
+                    # Answers are never deleted, the remaining ones would break the rules of the question type
+                    write_row(buffers['answer'], (new_id(), words(rng.randint(1, 4)), is_correct, question_id,
+                                                  answer_created, answer_created, False))
+                    counts['answer'] += 1
+
+    return buffers, counts
+
+def connect():
+    import psycopg2
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(ROOT, '.env'))
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT')
+    )
+
+_worker_conn = None
+
+def load_chunk(task):
+    """Worker: generate one chunk and COPY it (or write it to --output-dir)."""
+    global _worker_conn
+    options, chunk_index, first_user, last_user = task
+    buffers, counts = generate_chunk(options, chunk_index, first_user, last_user)
+
+    if options['output_dir']:
+        for name, buffer in buffers.items():
+            path = os.path.join(options['output_dir'], f'{name}_{chunk_index:06d}.tsv')
+            with open(path, 'w', encoding='utf-8') as file_object:
+                file_object.write(buffer.getvalue())
+        return counts
+
+    if _worker_conn is None:
+        _worker_conn = connect()
+        with _worker_conn.cursor() as cursor:
+            # Dữ liệu test, có thể chạy lại nếu mất, không cần chờ WAL flush
+            cursor.execute('set synchronous_commit = off')
+        _worker_conn.commit()
+
+    with _worker_conn.cursor() as cursor:
+        for name, target in TABLES:
+            buffers[name].seek(0)
+            cursor.copy_expert(f'COPY {target} FROM STDIN', buffers[name])
+    _worker_conn.commit()
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, required=True)
+    parser.add_argument('--start-user', type=int, default=0, help='Index of the first user, to add to an existing dataset')
+    parser.add_argument('--sets-per-user', type=Distribution, default=Distribution('poisson:5'))
+    parser.add_argument('--questions-per-set', type=Distribution, default=Distribution('uniform:10:50'))
+    parser.add_argument('--answers-per-question', type=Distribution, default=Distribution('uniform:2:5'),
+                        help='Raised to the minimum of the question type, Text_Fill always has one answer')
+    parser.add_argument('--question-types', type=parse_weights, default=parse_weights('Text_Fill=1,Multiple_Choice=2,Checkboxes=1'))
+    parser.add_argument('--deleted-ratio', type=float, default=0.05, help='Share of soft-deleted users, sets and questions')
+    parser.add_argument('--days', type=int, default=365, help='created_at is spread over this many days before now')
+    parser.add_argument('--email-domain', default='gen.example.com')
+    parser.add_argument('--password', default='Password123', help='Password of every generated user (hashed once)')
+    parser.add_argument('--role', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--chunk-users', type=int, default=2000, help='Users per COPY transaction')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output-dir', default=None, help='Write COPY files here instead of loading them')
+    parser.add_argument('--no-analyze', action='store_true', help='Skip ANALYZE after loading')
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.deleted_ratio <= 1:
+        parser.error('--deleted-ratio must be between 0 and 1')
+
+    import bcrypt
+    options = {
+        'seed': args.seed,
+        'sets_per_user': args.sets_per_user,
+        'questions_per_set': args.questions_per_set,
+        'answers_per_question': args.answers_per_question,
+        'type_weights': args.question_types,
+        'deleted_ratio': args.deleted_ratio,
+        'days': args.days,
+        'start_time': datetime.datetime.now().replace(microsecond=0) - datetime.timedelta(days=args.days),
+        'email_domain': args.email_domain,
+        'role': args.role,
+        # bcrypt is slow on purpose, one hash is shared by all users
+        'password_hash': bcrypt.hashpw(args.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+        'output_dir': args.output_dir
+    }
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    last = args.start_user + args.users
+    tasks = [
+        (options, first // args.chunk_users, first, min(first + args.chunk_users, last))
+        for first in range(args.start_user, last, args.chunk_users)
+    ]
+
+    totals = dict.fromkeys((name for name, _ in TABLES), 0)
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes=args.workers) as worker_pool:
+        for done, counts in enumerate(worker_pool.imap_unordered(load_chunk, tasks), 1):
+            for name, count in counts.items():
+                totals[name] += count
+            rows = sum(totals.values())
+            elapsed = time.perf_counter() - started
+            print(f'\r{done}/{len(tasks)} chunks, {rows} rows, {rows / elapsed:,.0f} rows/s', end='', flush=True)
+    print()
+
+    if not args.output_dir and not args.no_analyze:
+        conn = connect()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('analyze public."user", public.set, public.question, public.answer')
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(', '.join(f'{name}: {count}' for name, count in totals.items()) + f' in {elapsed:.1f}s')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
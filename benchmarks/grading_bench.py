@@ -0,0 +1,97 @@
+"""Microbenchmark of utils.grading on synthetic quizzes.
+
+Builds a quiz with random question types and answer keys like
+controller.quizzes stores them, random submissions (about half of the
+answers right) and reports how many submissions per second
+QuizKey.grade_batch scores on one core, next to a naive per-question
+grader for reference.
+
+    python -m benchmarks.grading_bench --questions 10 50 200 --submissions 5000
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+
+from benchmarks.generate_data import WORDS, QUESTION_TYPES, answers_for
+from utils.grading import QuizKey, answer_key, normalize_answer_text
+
+def random_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def synthetic_quiz(rng, questions):
+    """(stored questions, keys, {question_id: (type, [(answer_id, content, is_correct)])})."""
+    stored, keys, questions_by_id = [], [], {}
+    for _ in range(questions):
+        question_type = rng.choice(QUESTION_TYPES)
+        count = 1 if question_type == 'Text_Fill' else rng.randint(2, 5)
+        answers = [
+            (random_id(rng), ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))), is_correct)
+            for is_correct in answers_for(rng, question_type, count)
+        ]
+        question_id = random_id(rng)
+        stored.append([question_id, [answer_id for answer_id, _, _ in answers]])
+        keys.append(answer_key(question_type, [(content, is_correct) for _, content, is_correct in answers]))
+        questions_by_id[question_id] = (question_type, answers)
+    return stored, keys, questions_by_id
+
+def synthetic_submission(rng, questions_by_id):
+    submission = {}
+    for question_id, (question_type, answers) in questions_by_id.items():
+        right = rng.random() < 0.5
+        if question_type == 'Text_Fill':
+            submission[question_id] = answers[0][1].upper() if right else rng.choice(WORDS)
+        elif right:
+            submission[question_id] = [answer_id for answer_id, _, is_correct in answers if is_correct]
+        else:
+            submission[question_id] = [rng.choice(answers)[0]]
+    return submission
+
+def naive_grade(questions_by_id, answers):
+    """Reference grader: compare the chosen ids with the correct ids question by question."""
+    score = 0
+    for question_id, (question_type, question_answers) in questions_by_id.items():
+        value = answers.get(question_id)
+        if question_type == 'Text_Fill':
+            correct = [content for _, content, is_correct in question_answers if is_correct]
+            score += bool(correct) and normalize_answer_text(value) == normalize_answer_text(correct[0])
+        elif isinstance(value, list):
+            score += set(value) == {answer_id for answer_id, _, is_correct in question_answers if is_correct}
+    return score
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--submissions', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    for questions in args.questions:
+        stored, keys, questions_by_id = synthetic_quiz(rng, questions)
+        submissions = [synthetic_submission(rng, questions_by_id) for _ in range(args.submissions)]
+
+        start = time.perf_counter()
+        quiz_key = QuizKey(stored, keys)
+        compiled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        grades = quiz_key.grade_batch(submissions)
+        packed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = [naive_grade(questions_by_id, answers) for answers in submissions]
+        naive = time.perf_counter() - start
+
+        mismatches = sum(score != reference for (score, _), reference in zip(grades, expected))
+        print(f'{questions} questions, {args.submissions} submissions (key compiled in {compiled * 1e3:.2f} ms)')
+        print(f'    packed  {args.submissions / packed:12.0f} submissions/s')
+        print(f'    naive   {args.submissions / naive:12.0f} submissions/s  x{naive / packed:.1f}')
+        if mismatches:
+            print(f'    {mismatches} scores differ from the reference grader')
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
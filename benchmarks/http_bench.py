@@ -0,0 +1,400 @@
+"""End-to-end HTTP benchmark of the API.
+
+Starts the app against the Postgres configured in .env (DB_HOST, DB_NAME, ...),
+seeds a dataset of the requested size straight into the database, then drives
+the endpoints with concurrent clients and writes throughput and p50/p95/p99
+latency per endpoint to a JSON file.
+
+    python -m benchmarks.http_bench run --users 20 --sets-per-user 5 --questions-per-set 40 \\
+        --clients 16 --requests 2000 --output bench_abc123.json
+    python -m benchmarks.http_bench compare bench_base.json bench_abc123.json --threshold 10
+
+Pass --base-url to benchmark an app that is already running instead of
+starting one. Seeded rows use a per-run email domain, nothing else in the
+database is touched.
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import bcrypt
+import psycopg2
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mật khẩu chung của các user được seed, chỉ hash một lần
+PASSWORD = 'Benchmark123'
+
+WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliet',
+         'kilo', 'lima', 'mike', 'november', 'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango')
+
+SCENARIOS = ('login', 'set_read', 'set_list', 'search', 'question_create', 'question_update')
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def question_answers(rng, question_type):
+    """Answers that pass utils.validators.validate_question_and_answers for the type."""
+    if question_type == 'Text_Fill':
+        return [{'content': sentence(rng, 2), 'is_correct': True}]
+    if question_type == 'Multiple_Choice':
+        count = rng.randint(2, 5)
+        correct = rng.randrange(count)
+        return [{'content': sentence(rng, 3), 'is_correct': index == correct} for index in range(count)]
+    count = rng.randint(3, 6)
+    correct = set(rng.sample(range(count), rng.randint(2, count - 1)))
+    return [{'content': sentence(rng, 3), 'is_correct': index in correct} for index in range(count)]
+
+# ---------------------------------------------------------------- seeding
+
+def seed(conn, run_id, users, sets_per_user, questions_per_set, rng):
+    """Insert users, sets, questions and answers; return the fixtures the scenarios need."""
+    password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    now = datetime.datetime.now()
+    types = ('Text_Fill', 'Multiple_Choice', 'Checkboxes')
+
+    user_rows, set_rows, question_rows, answer_rows = [], [], [], []
+    fixtures = {'users': []}
+    for user_index in range(users):
+        user_id = str(uuid.uuid4())
+        email = f'user{user_index}@{run_id}.bench.example.com'
+        user_rows.append((user_id, f'Bench user {user_index}', email, password_hash, 1, now, now, False))
+        user_fixture = {'id': user_id, 'email': email, 'sets': []}
+
+        for set_index in range(sets_per_user):
+            set_id = str(uuid.uuid4())
+            set_rows.append((set_id, user_id, now, now, False, False, f'Set {set_index} {sentence(rng, 2)}', sentence(rng, 6)))
+            set_fixture = {'id': set_id, 'questions': []}
+
+            for question_index in range(questions_per_set):
+                question_id = str(uuid.uuid4())
+                question_type = types[question_index % len(types)]
+                created_at = now + datetime.timedelta(microseconds=question_index)
+                question_rows.append((question_id, sentence(rng, 8), question_type, set_id, created_at, created_at, False))
+
+                answers = []
+                for answer_index, answer in enumerate(question_answers(rng, question_type)):
+                    answer_id = str(uuid.uuid4())
+                    answer_created_at = created_at + datetime.timedelta(microseconds=answer_index)
+                    answer_rows.append((answer_id, answer['content'], answer['is_correct'], question_id,
+                                        answer_created_at, answer_created_at, False))
+                    answers.append({'id': answer_id, 'content': answer['content'], 'is_correct': answer['is_correct']})
+                set_fixture['questions'].append({'id': question_id, 'type': question_type, 'answers': answers})
+            user_fixture['sets'].append(set_fixture)
+        fixtures['users'].append(user_fixture)
+
+    with conn.cursor() as cursor:
+        cursor.executemany('''insert into public."user" (id, name, email, password, role, created_at, updated_at, is_deleted)
+                              values (%s, %s, %s, %s, %s, %s, %s, %s)''', user_rows)
+        cursor.executemany('''insert into public.set (id, user_id, created_at, updated_at, is_deleted, public_or_not, name, description)
+                              values (%s, %s, %s, %s, %s, %s, %s, %s)''', set_rows)
+        cursor.executemany('''insert into public.question (id, content, type, set_id, created_at, updated_at, is_deleted)
+                              values (%s, %s, %s, %s, %s, %s, %s)''', question_rows)
+        cursor.executemany('''insert into public.answer (id, content, is_correct, question_id, created_at, updated_at, is_deleted)
+                              values (%s, %s, %s, %s, %s, %s, %s)''', answer_rows)
+        cursor.execute('analyze public."user", public.set, public.question, public.answer')
+    conn.commit()
+
+    fixtures['rows'] = {
+        'users': len(user_rows),
+        'sets': len(set_rows),
+        'questions': len(question_rows),
+        'answers': len(answer_rows)
+    }
+    return fixtures
+
+# ---------------------------------------------------------------- http
+
+def call(base_url, method, path, body=None, token=None, timeout=30):
+    """Send one request, return (status code, parsed JSON body or None)."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    http_request = urllib.request.Request(base_url + path, data=data, method=method)
+    if data is not None:
+        http_request.add_header('Content-Type', 'application/json')
+    if token:
+        http_request.add_header('Authorization', f'Bearer {token}')
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b'null')
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, None
+
+def start_app(port):
+    """Run the app in a subprocess (no debugger / reloader) and wait for the health endpoint."""
+    command = [sys.executable, '-c', f'from app import app; app.run(host="127.0.0.1", port={port}, threaded=True)']
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The app exited while starting, run it by hand to see the error')
+        try:
+            if call(base_url, 'GET', '/api/v1/health', timeout=1)[0] == 200:
+                return process, base_url
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('The app did not answer /api/v1/health within 30 seconds')
+
+# ---------------------------------------------------------------- scenarios
+
+class Scenarios():
+    """Builds the (method, path, body, token) of each request from the seeded fixtures."""
+    def __init__(self, fixtures, tokens, rng_seed):
+        self.users = fixtures['users']
+        self.tokens = tokens
+        self.rng_seed = rng_seed
+        self._local = threading.local()
+
+    def _rng(self):
+        rng = getattr(self._local, 'rng', None)
+        if rng is None:
+            rng = self._local.rng = random.Random(f'{self.rng_seed}-{threading.get_ident()}')
+        return rng
+
+    def _user_and_set(self):
+        rng = self._rng()
+        user = rng.choice(self.users)
+        return rng, user, rng.choice(user['sets'])
+
+    def login(self):
+        user = self._rng().choice(self.users)
+        return 'POST', '/api/v1/users/login', {'email': user['email'], 'password': PASSWORD}, None
+
+    def set_read(self):
+        rng, user, set_fixture = self._user_and_set()
+        return 'GET', f'/api/v1/sets/{set_fixture["id"]}', None, self.tokens[user['id']]
+
+    def set_list(self):
+        rng, user, set_fixture = self._user_and_set()
+        page = rng.randint(1, max(1, len(user['sets']) // 10))
+        return 'GET', f'/api/v1/sets?page={page}&page_size=10', None, self.tokens[user['id']]
+
+    def search(self):
+        rng, user, set_fixture = self._user_and_set()
+        return 'GET', f'/api/v1/sets/search?id={set_fixture["id"]}&keyword={rng.choice(WORDS)}&page_size=20', None, self.tokens[user['id']]
+
+    def question_create(self):
+        rng, user, set_fixture = self._user_and_set()
+        question_type = rng.choice(('Text_Fill', 'Multiple_Choice', 'Checkboxes'))
+        body = {
+            'set_id': set_fixture['id'],
+            'content': sentence(rng, 8),
+            'type': question_type,
+            'answers': question_answers(rng, question_type)
+        }
+        return 'POST', '/api/v1/questions', body, self.tokens[user['id']]
+
+    def question_update(self):
+        # Rewrites the seeded answers with new content, the question stays valid
+        rng, user, set_fixture = self._user_and_set()
+        question = rng.choice(set_fixture['questions'])
+        body = {
+            'content': sentence(rng, 8),
+            'type': question['type'],
+            'delete_answers': [],
+            'add_answers': [],
+            'update_answers': [
+                {'id': answer['id'], 'content': sentence(rng, 3), 'is_correct': answer['is_correct']}
+                for answer in question['answers']
+            ]
+        }
+        return 'PUT', f'/api/v1/sets/{set_fixture["id"]}/questions/{question["id"]}', body, self.tokens[user['id']]
+
+def run_scenario(base_url, build_request, requests, clients, warmup):
+    """Send requests with clients concurrent workers, return the latency summary."""
+    for _ in range(warmup):
+        call(base_url, *build_request())
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            method, path, body, token = build_request()
+            started = time.perf_counter()
+            try:
+                status, _ = call(base_url, method, path, body, token)
+            except OSError:
+                status = 0
+            local_latencies.append(time.perf_counter() - started)
+            if not 200 <= status < 300:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        for future in [executor.submit(worker) for _ in range(clients)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) * 1000 / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    load_dotenv(os.path.join(ROOT, '.env'))
+    rng = random.Random(args.seed)
+    run_id = f'r{uuid.uuid4().hex[:10]}'
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT')
+    )
+    try:
+        print(f'Seeding {args.users} users x {args.sets_per_user} sets x {args.questions_per_set} questions ...')
+        fixtures = seed(conn, run_id, args.users, args.sets_per_user, args.questions_per_set, rng)
+    finally:
+        conn.close()
+
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url = start_app(args.port)
+
+    try:
+        tokens = {}
+        for user in fixtures['users']:
+            status, body = call(base_url, 'POST', '/api/v1/users/login', {'email': user['email'], 'password': PASSWORD})
+            if status != 200:
+                raise RuntimeError(f'Login of seeded user {user["email"]} failed with status {status}')
+            tokens[user['id']] = body['data']
+
+        scenarios = Scenarios(fixtures, tokens, args.seed)
+        results = {}
+        for name in args.scenarios:
+            print(f'{name}: {args.requests} requests, {args.clients} clients')
+            results[name] = run_scenario(base_url, getattr(scenarios, name), args.requests, args.clients, args.warmup)
+            print('    ' + ', '.join(f'{key}={value}' for key, value in results[name].items()))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            'users': args.users,
+            'sets_per_user': args.sets_per_user,
+            'questions_per_set': args.questions_per_set,
+            'clients': args.clients,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'seed': args.seed
+        },
+        'dataset': fixtures['rows'],
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as file_object:
+        json.dump(report, file_object, indent=2)
+    print(f'Wrote {args.output}')
+    return 0
+
+def compare(args):
+    """Print the change of every metric; exit 1 if a latency or throughput regressed over the threshold (%)."""
+    with open(args.base, encoding='utf-8') as file_object:
+        base = json.load(file_object)
+    with open(args.new, encoding='utf-8') as file_object:
+        new = json.load(file_object)
+
+    print(f'base {base.get("commit")}  ->  new {new.get("commit")}')
+    regressions = []
+    for name in sorted(set(base['results']) & set(new['results'])):
+        print(name)
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'errors'):
+            old_value = base['results'][name][metric]
+            new_value = new['results'][name][metric]
+            change = (new_value - old_value) * 100 / old_value if old_value else 0.0
+            # Throughput lower is worse, latency and errors higher is worse
+            worse = -change if metric == 'throughput_rps' else change
+            flag = ''
+            if metric != 'errors' and worse > args.threshold:
+                flag = '  REGRESSION'
+                regressions.append(f'{name}.{metric}')
+            print(f'    {metric:15} {old_value:>12} -> {new_value:>12}  ({change:+.1f}%){flag}')
+
+    if base.get('config') != new.get('config'):
+        print('Warning: the two runs used different configurations')
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Seed a dataset and benchmark the endpoints')
+    run_parser.add_argument('--users', type=int, default=20)
+    run_parser.add_argument('--sets-per-user', type=int, default=5)
+    run_parser.add_argument('--questions-per-set', type=int, default=40)
+    run_parser.add_argument('--clients', type=int, default=8, help='Concurrent clients per scenario')
+    run_parser.add_argument('--requests', type=int, default=1000, help='Requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=20, help='Requests per scenario sent before measuring')
+    run_parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--port', type=int, default=3100, help='Port of the app started by the benchmark')
+    run_parser.add_argument('--base-url', default=None, help='Benchmark an already running app instead')
+    run_parser.add_argument('--output', default='http_bench.json')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    return compare(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
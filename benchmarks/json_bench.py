@@ -0,0 +1,78 @@
+"""Microbenchmark of the JSON serializers on realistic set documents.
+
+Compares what jsonify did before (Flask's DefaultJSONProvider), the
+standard library fallback of utils.json_provider and orjson, on set
+documents (questions with answers, UUIDs and datetimes as psycopg2 returns
+them) of several sizes.
+
+    python -m benchmarks.json_bench --questions 10 100 1000 --repeat 200
+"""
+import argparse
+import datetime
+import random
+import sys
+import timeit
+import uuid
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.generate_data import WORDS, QUESTION_TYPES, answers_for
+from utils.json_provider import orjson, orjson_dumps, stdlib_dumps
+
+def set_document(rng, questions):
+    """Envelope of GET /api/v1/sets/<set_id> with ids and timestamps like rows from psycopg2."""
+    now = datetime.datetime(2024, 7, 1, 8, 30)
+    words = lambda count: ' '.join(rng.choice(WORDS) for _ in range(count))
+    document = {
+        'id': uuid.UUID(int=rng.getrandbits(128), version=4),
+        'name': words(3),
+        'description': words(10),
+        'created_at': now,
+        'questions': []
+    }
+    for index in range(questions):
+        question_type = rng.choice(QUESTION_TYPES)
+        document['questions'].append({
+            'question_id': uuid.UUID(int=rng.getrandbits(128), version=4),
+            'question_content': words(rng.randint(5, 15)) + '?',
+            'type': question_type,
+            'updated_at': now + datetime.timedelta(seconds=index),
+            'answers': [
+                {'answer_content': words(rng.randint(1, 4)), 'is_correct': is_correct}
+                for is_correct in answers_for(rng, question_type, rng.randint(2, 5))
+            ]
+        })
+    return {'status': True, 'message': 'Get all questions and answers successfully!', 'data': document}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    default_provider = DefaultJSONProvider(Flask(__name__))
+    serializers = [
+        ('flask default', lambda value: default_provider.dumps(value).encode('utf-8')),
+        ('stdlib', stdlib_dumps),
+    ]
+    if orjson is not None:
+        serializers.append(('orjson', orjson_dumps))
+    else:
+        print('orjson is not installed, only the standard library is measured')
+
+    rng = random.Random(args.seed)
+    for questions in args.questions:
+        document = set_document(rng, questions)
+        print(f'{questions} questions')
+        baseline = None
+        for name, function in serializers:
+            size = len(function(document))
+            seconds = min(timeit.repeat(lambda: function(document), number=args.repeat, repeat=3)) / args.repeat
+            baseline = baseline or seconds
+            print(f'    {name:14} {seconds * 1e6:12.1f} us  {size / seconds / 1e6:8.1f} MB/s  x{baseline / seconds:.1f}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""CPU cost of building set documents in Python vs in Postgres (json_agg).
+
+For each of the largest sets in the database (or the sets given with
+--set-id), both read paths of GET /api/v1/sets/<set_id> are run back to
+back without the document cache:
+
+    python   rows -> load_set_document -> app.json.dumps (what jsonify does)
+    postgres load_set_document_json -> raw_json_response (SET_JSON_FROM_DB=true)
+
+and the process CPU time (what the request thread spends) and wall time per
+request are reported. Run it against a database filled by
+benchmarks.generate_data, e.g. with --questions-per-set uniform:500:2000.
+
+    python -m benchmarks.set_document_bench --sets 5 --repeat 20 --output set_documents.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+
+from app import app
+from controller.sets import load_set_document, load_set_document_json
+from utils.raw_json import raw_json_response
+
+def python_path(cursor, set_id):
+    ret = {
+        'status': True,
+        'message': 'Get all questions and answers successfully!',
+        'data': load_set_document(cursor, set_id)
+    }
+    return app.json.dumps(ret).encode('utf-8')
+
+def postgres_path(cursor, set_id):
+    return raw_json_response({
+        'status': True,
+        'message': 'Get all questions and answers successfully!'
+    }, load_set_document_json(cursor, set_id)).get_data()
+
+def measure(function, cursor, set_id, repeat):
+    cpu, wall = [], []
+    size = 0
+    for _ in range(repeat):
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        size = len(function(cursor, set_id))
+        cpu.append(time.process_time() - cpu_started)
+        wall.append(time.perf_counter() - wall_started)
+    return {
+        'cpu_ms': round(statistics.median(cpu) * 1000, 3),
+        'wall_ms': round(statistics.median(wall) * 1000, 3),
+        'bytes': size
+    }
+
+def largest_sets(cursor, limit):
+    cursor.execute('''select q.set_id, count(*)
+                      from public.question q
+                      join public.answer a on a.question_id = q.id and a.is_deleted != true
+                      where q.is_deleted != true
+                      group by q.set_id
+                      order by count(*) desc
+                      limit %s''', (limit, ))
+    return [(str(set_id), rows) for set_id, rows in cursor.fetchall()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sets', type=int, default=5, help='Number of the largest sets to measure')
+    parser.add_argument('--set-id', action='append', default=None, help='Measure this set (repeatable)')
+    parser.add_argument('--repeat', type=int, default=20, help='Requests per set and path (the median is reported)')
+    parser.add_argument('--output', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST'),
+        database=os.getenv('DB_NAME'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        port=os.getenv('DB_PORT')
+    )
+    cursor = conn.cursor()
+    if args.set_id:
+        targets = [(set_id, None) for set_id in args.set_id]
+    else:
+        targets = largest_sets(cursor, args.sets)
+
+    results = []
+    with app.app_context():
+        for set_id, rows in targets:
+            # One warm-up of each path so both read from a warm buffer cache
+            python_path(cursor, set_id)
+            postgres_path(cursor, set_id)
+
+            python_result = measure(python_path, cursor, set_id, args.repeat)
+            postgres_result = measure(postgres_path, cursor, set_id, args.repeat)
+            saved = python_result['cpu_ms'] - postgres_result['cpu_ms']
+            results.append({
+                'set_id': set_id,
+                'rows': rows,
+                'python': python_result,
+                'postgres': postgres_result,
+                'cpu_saved_ms': round(saved, 3),
+                'cpu_saved_pct': round(saved * 100 / python_result['cpu_ms'], 1) if python_result['cpu_ms'] else 0.0
+            })
+            print(f'{set_id} ({rows} rows): python cpu {python_result["cpu_ms"]} ms / wall {python_result["wall_ms"]} ms, '
+                  f'postgres cpu {postgres_result["cpu_ms"]} ms / wall {postgres_result["wall_ms"]} ms, '
+                  f'cpu saved {results[-1]["cpu_saved_pct"]}%')
+            conn.rollback()
+
+    cursor.close()
+    conn.close()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file_object:
+            json.dump({'repeat': args.repeat, 'results': results}, file_object, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,7 +2,7 @@ from constants.http_status_code import *
 from flask import *
 from flask import Blueprint, request, jsonify, current_app, session
 from werkzeug.security import check_password_hash, generate_password_hash
-from flask_jwt_extended import jwtrequired, create_access_token, create_refresh_token, get_jwt_identity
+from flask_jwt_extended import jwt_required, create_access_token, create_refresh_token, get_jwt_identity
 from flasgger import swag_from
 from database import *
 from psycopg2 import sql
@@ -12,13 +12,14 @@ import traceback
 import datetime
 from utils.validators import validate_email, validate_name, validate_integer, is_boolean, is_valid_uuid
 from utils.database import get_db_connection
+from utils.guards import check_ownership
 
 answers = Blueprint("answers", __name__, url_prefix="/api/v1")
 
 # Vấn đề gặp phải, là khi thêm 1 câu trả lời đâu cần phải check là question đó có thỏa hay không. Có nên CRUD answer không? Nếu cần thì thật sự ko cần check
 # CREATE
 @answers.post("/answers")
-@swag_from("../docs/answers/create.yaml")
+@swag_from("../docs/answer/create.yaml")
 @user_token_required
 @set_id_required
 @question_id_required
@@ -28,12 +29,11 @@ def create_answer(user_id, set_id, question_id):
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # Check user, set, question and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id)
+
         # Check if user is deleted
-        query = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query, (user_id, ))
-        
-        user_deleted = cursor.fetchone()
-        if user_deleted[0]:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
@@ -41,18 +41,14 @@ def create_answer(user_id, set_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if set is deleted or user isn't owner of set
-        query1 = sql.SQL('''select * from public.set where id = %s and user_id = %s''')
-        cursor.execute(query1, (set_id, user_id, ))
-        check_set_user = cursor.fetchone()
-
-        if check_set_user is None or len(check_set_user) == 0:
+        if not ownership.is_owner:
             ret = {
                 'status': False,
                 'message': 'User is not owner of question!'
             }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        if check_set_user[4]:
+        if ownership.set_deleted:
             ret = {
                 'status': False,
                 'message': 'This set has been deleted!'
@@ -60,22 +56,19 @@ def create_answer(user_id, set_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if set don't include question or question is deleted
-        query2 = sql.SQL('''select * from public.question where id = %s and set_id = %s''')
-        cursor.execute(query2, (question_id, set_id, ))
-        check_question_set = cursor.fetchone()
-
-        if check_question_set is None or len(check_question_set):
+        if not ownership.question_in_set:
             ret = {
                 'status': False,
                 'message': 'Set do not include question!'
             }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        if check_question_set[6]:
+        if ownership.question_deleted:
             ret = {
                 'status': False,
                 'message': 'This question has been deleted!'
             }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
 
         ret = {
             'status': True, 
@@ -117,7 +110,7 @@ def create_answer(user_id, set_id, question_id):
         }) 
 
         # Validate question and answers
-        validation_error = validate_question_and_answers(type, list_answers)
+        validation_error = validate_question_and_answers(ownership.question_type, list_answers)
         if validation_error:
             message, status_code = validation_error
             return jsonify({'status': False, 'message': message}), status_code
@@ -133,6 +126,7 @@ def create_answer(user_id, set_id, question_id):
         cursor.execute(query4, (content, is_correct, question_id, datetime.datetime.now(), datetime.datetime.now(), False))
     
         id_return = cursor.fetchone()
+        conn.commit()
         ret['id'] = id_return[0]
 
         return jsonify(ret), HTTP_200_OK
@@ -150,9 +144,9 @@ def create_answer(user_id, set_id, question_id):
             conn.close()
 
 @answers.put("/sets/<string:set_id>/questions/<string:question_id>/answers/<string:answer_id>")
-@swag_from("../docs/answers/update.yaml")
+@swag_from("../docs/answer/update.yaml")
 @user_token_required
-def delete_set(user_id, set_id, question_id, answer_id):
+def update_answer(user_id, set_id, question_id, answer_id):
     try:
         # Create connection
         conn = get_db_connection()
@@ -166,12 +160,11 @@ def delete_set(user_id, set_id, question_id, answer_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
 
+        # Check user, set, question, answer and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id, answer_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        is_deleted = cursor.fetchone()
-        if not is_deleted:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
@@ -179,11 +172,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -191,11 +180,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_403_FORBIDDEN
         
         # Check if set don't include question
-        query3 = sql.SQL('''select * from public.question where set_id = %s and id = %s''')
-        cursor.execute(query3, (set_id, question_id, ))
-
-        check_set_question = cursor.fetchone()
-        if check_set_question is None or len(check_set_question) == 0:
+        if not ownership.question_in_set:
             ret = {
                     'status': False,
                     'message':'Sorry, set do not include question!'
@@ -203,11 +188,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if question don't include answer
-        query4 = sql.SQL('''select * from public.answer where question_id = %s and id = %s''')
-        cursor.execute(query4, (question_id, answer_id, ))
-
-        check_question_answer = cursor.fetchone()
-        if check_question_answer is None or len(check_question_answer) == 0:
+        if not ownership.answer_in_question:
             ret = {
                 'status': False,
                 'message': 'Sorry, question do not include answer!'
@@ -247,9 +228,9 @@ def delete_set(user_id, set_id, question_id, answer_id):
                 'is_correct': now_is_correct
             }
 
-        query4 = sql.SQL('''update public.answer set content = %s, is_correct = %s where id = %s''')
+        query4 = sql.SQL('''update public.answer set content = %s, is_correct = %s, updated_at = %s where id = %s''')
         
-        cursor.execute(query4, (now_content if content == "" else content, now_is_correct if is_correct == "" else is_correct, answer_id))
+        cursor.execute(query4, (now_content if content == "" else content, now_is_correct if is_correct == "" else is_correct, datetime.datetime.now(), answer_id))
         conn.commit()
 
         ret['data'] = {
@@ -273,9 +254,9 @@ def delete_set(user_id, set_id, question_id, answer_id):
             conn.close()
 
 @answers.delete("/sets/<string:set_id>/questions/<string:question_id>/answers/<string:answer_id>")
-@swag_from("../docs/answers/delete.yaml")
+@swag_from("../docs/answer/delete.yaml")
 @user_token_required
-def delete_set(user_id, set_id, question_id, answer_id):
+def delete_answer(user_id, set_id, question_id, answer_id):
     try:
         # Create connection
         conn = get_db_connection()
@@ -289,12 +270,11 @@ def delete_set(user_id, set_id, question_id, answer_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
 
+        # Check user, set, question, answer and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id, answer_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        is_deleted = cursor.fetchone()
-        if not is_deleted:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
@@ -302,11 +282,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -314,11 +290,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_403_FORBIDDEN
         
         # Check if set don't include question
-        query3 = sql.SQL('''select * from public.question where set_id = %s and id = %s''')
-        cursor.execute(query3, (set_id, question_id, ))
-
-        check_set_question = cursor.fetchone()
-        if check_set_question is None or len(check_set_question) == 0:
+        if not ownership.question_in_set:
             ret = {
                     'status': False,
                     'message':'Sorry, set do not include question!'
@@ -326,11 +298,7 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
         # Check if question don't include answer
-        query4 = sql.SQL('''select * from public.answer where question_id = %s and id = %s''')
-        cursor.execute(query4, (question_id, answer_id, ))
-
-        check_question_answer = cursor.fetchone()
-        if check_question_answer is None or len(check_question_answer) == 0:
+        if not ownership.answer_in_question:
             ret = {
                 'status': False,
                 'message': 'Sorry, question do not include answer!'
@@ -338,9 +306,9 @@ def delete_set(user_id, set_id, question_id, answer_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Update question information
-        query5 = sql.SQL('''update public.answer set is_deleted = %s where id = %s''')
+        query5 = sql.SQL('''update public.answer set is_deleted = %s, updated_at = %s where id = %s''')
         
-        cursor.execute(query5, (True, answer_id, ))
+        cursor.execute(query5, (True, datetime.datetime.now(), answer_id, ))
         conn.commit()
 
         # Return response
@@ -2,8 +2,7 @@ import jwt
 from functools import wraps
 from flask import request
 from flask.json import jsonify
-from flask import current_app 
-from fakeredis import FakeStrictRedis
+from flask import current_app, g
 from constants.http_status_code import *
 from psycopg2 import sql
 
@@ -11,9 +10,82 @@ from error_handle import *
 
 from utils.database import *
 from utils.validators import *
+from utils.cache import LRUCache
+from utils.session_store import session_store, token_id
+import hashlib
+import os
 
-# Connect to redis server
-redis_client = FakeStrictRedis()
+# Thời gian sống của token (giờ)
+TOKEN_LIFETIME_HOURS = 12
+
+# Token cũ (không có claim user_id): cache email -> (user_id, is_deleted) để không query mỗi request
+user_id_cache = LRUCache(max_bytes=4 * 1024 * 1024, ttl=float(os.getenv('USER_ID_CACHE_TTL', 300)))
+
+# Payload của các token đã kiểm tra chữ ký, mỗi entry hết hạn cùng lúc với token
+verified_tokens = LRUCache(max_bytes=int(os.getenv('TOKEN_CACHE_MAX_BYTES', 16 * 1024 * 1024)), ttl=TOKEN_LIFETIME_HOURS * 3600)
+
+def _token_key(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def decode_token(token):
+    """jwt.decode with a cache of verified payloads: repeated requests skip the HMAC check."""
+    key = _token_key(token)
+    payload = verified_tokens.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+
+    ttl = payload.get('expiration', 0) - datetime.datetime.now().timestamp()
+    if ttl > 0:
+        verified_tokens.set(key, payload, ttl=ttl)
+    return payload
+
+def forget_token(token):
+    """Drop a token from the verified cache (logout)."""
+    verified_tokens.delete(_token_key(token))
+
+def forget_user(user_id, email=None):
+    """Must be called when a user is deleted: their tokens stop working right away, in every worker.
+
+    The mark lives in the shared session store as long as a token issued before the deletion.
+    """
+    session_store.revoke_user(user_id, TOKEN_LIFETIME_HOURS * 3600)
+    if email is not None:
+        user_id_cache.delete(email)
+
+def resolve_user(payload):
+    """Return (user_id, is_deleted) of a verified token payload.
+
+    Tokens issued by login carry user_id and is_deleted as signed claims, so
+    no query is needed. Older tokens only have the email: it is translated
+    once and kept in a small TTL cache.
+    """
+    if 'user_id' in payload:
+        user_id = payload['user_id']
+        is_deleted = payload.get('is_deleted', False) or session_store.is_user_revoked(user_id)
+        return user_id, is_deleted
+
+    cached = user_id_cache.get(payload['email'])
+    if cached is not None:
+        user_id, is_deleted = cached
+        return user_id, is_deleted or session_store.is_user_revoked(user_id)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        query = sql.SQL('''select id, is_deleted from public."user" where email = %s''')
+        cursor.execute(query, (payload['email'], ))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+
+    if row is None:
+        return None, True
+
+    user_id, is_deleted = str(row[0]), bool(row[1])
+    user_id_cache.set(payload['email'], (user_id, is_deleted))
+    return user_id, is_deleted or session_store.is_user_revoked(user_id)
 
 def token_required(func):
     @wraps(func)
@@ -39,7 +111,7 @@ def token_required(func):
             return jsonify(ret), HTTP_401_UNAUTHORIZED
 
         try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'],algorithms=["HS256"])
+            payload = decode_token(token)
         except Exception as e:
             ret = {
                 'status':False,
@@ -53,30 +125,32 @@ def token_required(func):
         
         # Check whether payload after decode is none or not 
         if payload is not None:
-            if datetime.datetime.now().timestamp() <= payload['expiration']:
-                # Return func with input data
-                return func(*args, **kwargs)
-            elif datetime.datetime.now().timestamp() > payload['expiration']:
+            if datetime.datetime.now().timestamp() > payload['expiration']:
                 ret = {
                     'status':False,
                     'message':'Sorry, token expired!'
                 }
                 return jsonify(ret), HTTP_401_UNAUTHORIZED
-            else:
-                keys = redis_client.keys('*')
-            
-                # Get value for each key
-                data = {}
 
-                for key in keys:
-                    data[key.decode('utf-8')] = redis_client.get(key).decode('utf-8')
+            # Token has been revoked by logout
+            if session_store.is_revoked(token_id(payload, token)):
+                ret = {
+                    'status':False,
+                    'message':'Sorry, token is not exist!'
+                }
+                return jsonify(ret), HTTP_403_FORBIDDEN
 
-                if token not in data.values():
-                    ret = {
-                        'status':False,
-                        'message':'Sorry, token is not exist!'
-                    }
-                    return jsonify(ret),403
+            # Tokens of a deleted user stop working before they expire
+            user_id, is_deleted = resolve_user(payload)
+            if user_id is None or is_deleted:
+                ret = {
+                    'status':False,
+                    'message':'Sorry, this account has been deleted!'
+                }
+                return jsonify(ret), HTTP_401_UNAUTHORIZED
+
+            # Return func with input data
+            return func(*args, **kwargs)
         else:
             ret = {
                 'status':False,
@@ -110,7 +184,7 @@ def user_token_required(func):
             return jsonify(ret), HTTP_401_UNAUTHORIZED
 
         try:
-            payload = jwt.decode(token, current_app.config['SECRET_KEY'],algorithms=["HS256"])
+            payload = decode_token(token)
         except Exception as e:
             ret = {
                 'status':False,
@@ -124,42 +198,36 @@ def user_token_required(func):
         
         # Check whether payload after decode is none or not 
         if payload is not None:
-            if datetime.datetime.now().timestamp() <= payload['expiration']:
-                # Thêm user_id để trả về cho hàm
-                conn = get_db_connection()
-                cursor = conn.cursor()
-
-                query = sql.SQL('''select id from public."user" where email = %s''')
-                cursor.execute(query, (payload['email'], ))
-                
-                user_id = cursor.fetchone()
-
-                cursor.close()
-                conn.close()
-
-                # Return func with input data
-                return func(*args, **kwargs, user_id = user_id[0])
-            elif datetime.datetime.now().timestamp() > payload['expiration']:
+            if datetime.datetime.now().timestamp() > payload['expiration']:
                 ret = {
                     'status':False,
                     'message':'Sorry, token expired!'
                 }
                 return jsonify(ret), HTTP_401_UNAUTHORIZED
-            else:
-                keys = redis_client.keys('*')
-            
-                # Get value for each key
-                data = {}
 
-                for key in keys:
-                    data[key.decode('utf-8')] = redis_client.get(key).decode('utf-8')
+            # Token has been revoked by logout
+            if session_store.is_revoked(token_id(payload, token)):
+                ret = {
+                    'status':False,
+                    'message':'Sorry, token is not exist!'
+                }
+                return jsonify(ret), HTTP_403_FORBIDDEN
+
+            # Thêm user_id để trả về cho hàm (lấy từ claim của token, không cần query)
+            user_id, is_deleted = resolve_user(payload)
 
-                if token not in data.values():
-                    ret = {
-                        'status':False,
-                        'message':'Sorry, token is not exist!'
-                    }
-                    return jsonify(ret),403
+            if user_id is None or is_deleted:
+                ret = {
+                    'status':False,
+                    'message':'Sorry, this account has been deleted!'
+                }
+                return jsonify(ret), HTTP_401_UNAUTHORIZED
+
+            # Lưu user_id cho log của request
+            g.user_id = user_id
+
+            # Return func with input data
+            return func(*args, **kwargs, user_id = user_id)
         else:
             ret = {
                 'status':False,
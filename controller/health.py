@@ -0,0 +1,40 @@
+from constants.http_status_code import *
+from flask import Blueprint, jsonify, request
+from flasgger import swag_from
+from utils.database import pool
+from utils.cache import set_document_cache
+from utils.query_stats import query_stats
+from utils.passwords import password_hasher
+from controller.auth_middleware import verified_tokens
+from error_handle import log_writer
+
+health = Blueprint("health", __name__, url_prefix="/api/v1/health")
+
+@health.get("")
+@swag_from("../docs/health/health.yaml")
+def get_health():
+    ret = {
+        'status': True,
+        'message': 'Service is running!',
+        'data': {
+            'db_pool': pool.stats(),
+            'set_document_cache': set_document_cache.stats(),
+            'verified_token_cache': verified_tokens.stats(),
+            'log_writer': log_writer.stats(),
+            'query_stats': query_stats.stats(),
+            'password_hasher': password_hasher.stats()
+        }
+    }
+    return jsonify(ret), HTTP_200_OK
+
+@health.get("/queries")
+@swag_from("../docs/health/queries.yaml")
+def get_query_stats():
+    limit = request.args.get('limit', 20, type=int)
+    order_by = request.args.get('order_by', 'total_ms')
+    ret = {
+        'status': True,
+        'message': 'Get query statistics successfully!',
+        'data': query_stats.top(limit=max(1, min(limit, 200)), order_by=order_by)
+    }
+    return jsonify(ret), HTTP_200_OK
@@ -13,9 +13,28 @@ import datetime
 
 from utils.validators import is_valid_uuid, is_valid_question_type
 from utils.database import get_db_connection 
+from utils.guards import check_ownership
 
 questions = Blueprint("questions", __name__, url_prefix="/api/v1")
 
+# Extra functions
+def is_correct_value(answer):
+    return answer['is_correct'] in [True, "True"]
+
+def insert_answers(cursor, question_id, list_answers, now):
+    """Insert all answers of a question with one multi-row statement."""
+    if not list_answers:
+        return
+    query = sql.SQL('''insert into public.answer (content, is_correct, question_id, created_at, updated_at, is_deleted)
+                        select v.content, v.is_correct, %s, %s, %s, false
+                        from unnest(%s::varchar[], %s::boolean[]) with ordinality as v(content, is_correct, position)
+                        order by v.position''')
+    cursor.execute(query, (
+        question_id, now, now,
+        [answer['content'] for answer in list_answers],
+        [is_correct_value(answer) for answer in list_answers]
+    ))
+
 # CREATE
 @questions.post("/questions")
 @swag_from("../docs/questions/create.yaml")
@@ -75,12 +94,11 @@ def create_question(user_id, set_id):
             message, status_code = validation_error
             return jsonify({'status': False, 'message': message}), status_code
         
+        # Check user, set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        user_is_deleted = cursor.fetchone()
-        if not user_is_deleted:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'This user has been deleted!'
@@ -88,19 +106,14 @@ def create_question(user_id, set_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if is not owner or set is deleted
-        query2 = sql.SQL('''select is_deleted from public.set where id = %s and user_id = %s''')
-        cursor.execute(query2, (set_id, user_id))
-        
-        set_is_deleted = cursor.fetchone()
-
-        if len(set_is_deleted) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
                 }
             return jsonify(ret), HTTP_403_FORBIDDEN
          
-        if not set_is_deleted:
+        if ownership.set_deleted:
             ret = {
                     'status': False,
                     'message':'This set has been deleted!'
@@ -113,11 +126,8 @@ def create_question(user_id, set_id):
         cursor.execute(query3, (content, type, set_id, datetime.datetime.now(), datetime.datetime.now(), False))
         question_id = cursor.fetchone()[0]
 
-        # Create answers of this question
-        query4 = sql.SQL('''insert into public.answer (content, is_correct, question_id, created_at, updated_at, is_deleted)
-                         values (%s, %s, %s, %s, %s, %s)''')
-        for answer in list_answers:
-            cursor.execute(query4, (answer['content'], answer['is_correct'], question_id, datetime.datetime.now(), datetime.datetime.now(), False))
+        # Create answers of this question (one statement for all answers)
+        insert_answers(cursor, question_id, list_answers, datetime.datetime.now())
         conn.commit()
         
         # Return response
@@ -156,12 +166,11 @@ def delete_set(user_id, set_id, question_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
 
+        # Check user, set, question and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        is_deleted = cursor.fetchone()
-        if not is_deleted:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
@@ -169,11 +178,7 @@ def delete_set(user_id, set_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -181,11 +186,7 @@ def delete_set(user_id, set_id, question_id):
             return jsonify(ret), HTTP_403_FORBIDDEN
         
         # Check if set don't include question
-        query3 = sql.SQL('''select * from public.question where set_id = %s and id = %s''')
-        cursor.execute(query3, (set_id, question_id, ))
-
-        check_set_question = cursor.fetchone()
-        if check_set_question is None or len(check_set_question) == 0:
+        if not ownership.question_in_set:
             ret = {
                     'status': False,
                     'message':'Sorry, set do not include question!'
@@ -193,9 +194,9 @@ def delete_set(user_id, set_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
         # Update question information
-        query4 = sql.SQL('''update public.question set is_deleted = %s where id = %s''')
+        query4 = sql.SQL('''update public.question set is_deleted = %s, updated_at = %s where id = %s''')
         
-        cursor.execute(query4, (True, question_id))
+        cursor.execute(query4, (True, datetime.datetime.now(), question_id))
         conn.commit()
 
         # Return response
@@ -235,12 +236,11 @@ def update_question(user_id, set_id, question_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
 
-        # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        is_deleted = cursor.fetchone()
+        # Check user, set, question and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id)
 
-        if not is_deleted:
+        # Check if user is deleted
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Owner of set has been deleted!'
@@ -248,11 +248,7 @@ def update_question(user_id, set_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -260,11 +256,7 @@ def update_question(user_id, set_id, question_id):
             return jsonify(ret), HTTP_403_FORBIDDEN
         
         # Check if set don't include question
-        query3 = sql.SQL('''select * from public.question where set_id = %s and id = %s''')
-        cursor.execute(query3, (set_id, question_id, ))
-
-        check_set_question = cursor.fetchone()
-        if check_set_question is None or len(check_set_question) == 0:
+        if not ownership.question_in_set:
             ret = {
                     'status': False,
                     'message':'Sorry, set do not include question!'
@@ -288,37 +280,41 @@ def update_question(user_id, set_id, question_id):
                 'message': message
             }), status_code
 
-        # Start transaction
-        cursor.execute('BEGIN')
+        # The transaction is opened implicitly by the first statement, every list
+        # is written with a single set-based statement whatever its length
+        now = datetime.datetime.now()
 
         # Delete answers
-        for answer_id in list_answers_to_delete:
+        if list_answers_to_delete:
             cursor.execute(
-                '''update public.answer set is_deleted = %s where id = %s''',
-                (True, answer_id)
+                '''update public.answer set is_deleted = true, updated_at = %s
+                   where question_id = %s and id = any(%s::uuid[])''',
+                (now, question_id, list_answers_to_delete)
             )
 
         # Add new answers
-        for answer in list_answers_to_add:
-            cursor.execute(
-                '''insert into public.answer (content, is_correct, question_id, created_at, updated_at, is_deleted)
-                   values (%s, %s, %s, %s, %s, %s)''',
-                (answer['content'], answer['is_correct'], question_id, datetime.datetime.now(), datetime.datetime.now(), False)
-            )
+        insert_answers(cursor, question_id, list_answers_to_add, now)
 
         # Update existing answers
-        for answer in list_answers_to_update:
+        if list_answers_to_update:
             cursor.execute(
-                '''update public.answer set content = %s, is_correct = %s, updated_at = %s 
-                   where id = %s and question_id = %s''',
-                (answer['content'], answer['is_correct'], datetime.datetime.now(), answer['id'], question_id)
+                '''update public.answer a set content = v.content, is_correct = v.is_correct, updated_at = %s
+                   from unnest(%s::uuid[], %s::varchar[], %s::boolean[]) as v(id, content, is_correct)
+                   where a.id = v.id and a.question_id = %s''',
+                (
+                    now,
+                    [answer['id'] for answer in list_answers_to_update],
+                    [answer['content'] for answer in list_answers_to_update],
+                    [is_correct_value(answer) for answer in list_answers_to_update],
+                    question_id
+                )
             )
 
         # Update question content and type if needed
         cursor.execute(
             '''update public.question set content = %s, type = %s, updated_at = %s 
                where id = %s and set_id = %s''',
-            (content, question_type, datetime.datetime.now(), question_id, set_id)
+            (content, question_type, now, question_id, set_id)
         )
 
         # Commit transaction
@@ -342,7 +338,7 @@ def update_question(user_id, set_id, question_id):
 @swag_from("../docs/questions/all_answers.yaml")
 @user_token_required
 @set_id_required
-def get_all_questions_of_set(user_id, question_id):
+def get_all_questions_of_set(user_id, set_id, question_id):
     try:
         # Create connection
         conn = get_db_connection()
@@ -356,32 +352,26 @@ def get_all_questions_of_set(user_id, question_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
         
-        # Check if user is deleted
-        query = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query, (user_id, ))
-        is_deleted = cursor.fetchone()
+        # Check user, question and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id, question_id)
 
-        if not is_deleted:
+        # Check if user is deleted
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Owner of questions has been deleted!'
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        # Check if set is not exist or is deleted 
-        query1 = sql.SQL('''select is_deleted from public.question where id = %s''')
-        cursor.execute(query1, (question_id, ))
-
-        check_deleted = cursor.fetchone()
-
-        if check_deleted is None:
+        # Check if question is not exist or is deleted 
+        if not ownership.question_exists:
             ret = {
                 'status':False,
                 'message':'This question is not exist!'
             }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        if check_deleted[0]: 
+        if ownership.question_deleted: 
             ret = {
                 'status':False,
                 'message':'This questions has been deleted!'
@@ -389,17 +379,7 @@ def get_all_questions_of_set(user_id, question_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of questions
-        query2 = sql.SQL('''select * 
-                         from public."user" a
-                         join public.set b
-                         on a.id = b.user_id and a.id = %s
-                         join public.question c
-                         on b.id = c.set_id and c.id = %s''')
-        cursor.execute(query2, (user_id, question_id, ))
-
-        check_question_user = cursor.fetchone()
-        
-        if check_question_user is None or len(check_question_user) == 0:
+        if not ownership.is_owner or not ownership.question_in_set:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
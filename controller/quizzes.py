@@ -0,0 +1,479 @@
+from constants.http_status_code import *
+from flask import *
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from psycopg2 import sql
+from psycopg2.extras import Json
+from error_handle import *
+from controller.auth_middleware import *
+import traceback
+import datetime
+import os
+import random
+
+from utils.validators import is_valid_uuid, validate_integer, is_boolean
+from utils.database import get_db_connection
+from utils.guards import check_ownership
+from utils.queries import SET_QUESTION_SEQ, QUESTIONS_BY_ORDINAL, REMAINING_QUESTION_IDS
+from utils.cache import LRUCache, estimate_size
+from utils.grading import QuizKey, answer_key
+
+quizzes = Blueprint("quizzes", __name__, url_prefix="/api/v1/quizzes")
+
+DEFAULT_QUIZ_QUESTIONS = 10
+MAX_QUIZ_QUESTIONS = 200
+
+# Phiên bản định dạng JSON lưu trong quiz_question_answer.json_question_answer:
+# {'v', 'q': câu hỏi và đáp án theo thứ tự đã xáo, 'k': answer key tính sẵn lúc tạo quiz,
+#  'c': bản chụp nội dung câu hỏi / đáp án mà key được tính từ đó (quiz không đổi sau khi tạo)}
+QUIZ_FORMAT_VERSION = 1
+
+# Số bài nộp tối đa trong một request chấm bài
+MAX_GRADE_BATCH = int(os.getenv('GRADE_MAX_BATCH', 5000))
+
+# Answer key đã biên dịch của các quiz vừa chấm: quiz_id -> (owner_id, public_or_not, QuizKey)
+quiz_keys = LRUCache(max_bytes=int(os.getenv('QUIZ_KEY_CACHE_MAX_BYTES', 32 * 1024 * 1024)), ttl=float(os.getenv('QUIZ_KEY_CACHE_TTL', 600)))
+
+# Số vòng rút ordinal ngẫu nhiên trước khi lấp phần còn thiếu từ các câu hỏi còn lại
+MAX_PROBE_ROUNDS = 4
+
+# Extra functions
+def draw_ordinals(rng, max_ordinal, tried, count):
+    """Up to count ordinals in [1, max_ordinal] drawn at random with rng, none of them in tried (updated)."""
+    count = min(count, max_ordinal - len(tried))
+    drawn = []
+    while len(drawn) < count:
+        ordinal = rng.randint(1, max_ordinal)
+        if ordinal not in tried:
+            tried.add(ordinal)
+            drawn.append(ordinal)
+    return drawn
+
+def sample_question_ids(cursor, set_id, count, rng):
+    """Up to count distinct live question ids of the set, uniformly at random with rng.
+
+    Questions carry a dense ordinal inside their set (migration 0005).
+    Random ordinals are drawn without replacement and looked up on the
+    partial (set_id, ordinal) index; ordinals of deleted questions miss and
+    are drawn again. That is rejection sampling, so every live question has
+    the same chance, and each round costs one index lookup per ordinal: the
+    cost depends on count, not on the size of the set (no ORDER BY random()).
+    When most ordinals belong to deleted questions and the rounds still
+    leave the quiz short, the rest is drawn from the remaining live questions.
+    """
+    cursor.execute(SET_QUESTION_SEQ, {'set_id': set_id})
+    row = cursor.fetchone()
+    max_ordinal = row[0] if row else 0
+
+    chosen = []
+    tried = set()
+    for _ in range(MAX_PROBE_ROUNDS):
+        missing = count - len(chosen)
+        if missing <= 0:
+            break
+        # Ordinals of deleted questions miss, ask for more than missing
+        ordinals = draw_ordinals(rng, max_ordinal, tried, missing * 2)
+        if not ordinals:
+            break
+        cursor.execute(QUESTIONS_BY_ORDINAL, {'set_id': set_id, 'ordinals': ordinals})
+        found = {ordinal: str(question_id) for ordinal, question_id in cursor.fetchall()}
+        # Keep the random order of the draw
+        chosen.extend([found[ordinal] for ordinal in ordinals if ordinal in found][:missing])
+
+    # Rất hiếm (set mà phần lớn câu hỏi đã bị xóa): rút phần còn thiếu từ các câu hỏi sống còn lại
+    missing = count - len(chosen)
+    if missing > 0 and len(tried) < max_ordinal:
+        cursor.execute(REMAINING_QUESTION_IDS, {'set_id': set_id, 'chosen': chosen})
+        remaining = [str(question_id) for (question_id, ) in cursor.fetchall()]
+        chosen.extend(rng.sample(remaining, min(missing, len(remaining))))
+    return chosen
+
+def build_quiz(cursor, question_ids, rng):
+    """Stored questions, answer keys and content snapshot of the sampled questions.
+
+    [[question_id, [answer ids in shuffled order]], ...], [answer key, ...] and
+    [[question content, type, [answer contents in the same order]], ...].
+    """
+    cursor.execute('''select b.id, b.content, b.type, c.id, c.content, c.is_correct
+                      from public.question b
+                      left join public.answer c
+                      on c.question_id = b.id and c.is_deleted != true
+                      where b.id = any(%s::uuid[]) and b.is_deleted != true
+                      order by b.id, c.id''', (question_ids, ))
+    questions = {}
+    for question_id, question_content, question_type, answer_id, answer_content, is_correct in cursor.fetchall():
+        question = questions.setdefault(str(question_id), (question_content, question_type, []))
+        if answer_id is not None:
+            question[2].append((str(answer_id), answer_content, is_correct))
+
+    quiz = []
+    keys = []
+    contents = []
+    for question_id in question_ids:
+        # Câu hỏi bị xóa ngay sau khi được chọn
+        if question_id not in questions:
+            continue
+        question_content, question_type, question_answers = questions[question_id]
+        rng.shuffle(question_answers)
+        quiz.append([question_id, [answer_id for answer_id, _, _ in question_answers]])
+        keys.append(answer_key(question_type, [(content, is_correct) for _, content, is_correct in question_answers]))
+        contents.append([question_content, question_type, [content for _, content, _ in question_answers]])
+    return quiz, keys, contents
+
+def load_quiz_key(cursor, quiz_id):
+    """(owner_id, public_or_not, QuizKey) of a live quiz, None if there is none.
+
+    A quiz never changes after it is generated, its key is cached per quiz.
+    """
+    cached = quiz_keys.get(quiz_id)
+    if cached is not None:
+        return cached
+
+    cursor.execute(sql.SQL('''select q.user_id, q.public_or_not, a.json_question_answer
+                              from public.quiz q
+                              join public.quiz_question_answer a
+                              on a.quiz_id = q.id
+                              where q.id = %s and q.is_deleted = false'''), (quiz_id, ))
+    quiz = cursor.fetchone()
+    if quiz is None:
+        return None
+
+    owner_id, public_or_not, stored = quiz
+    # Cỡ của key đã biên dịch xấp xỉ cỡ JSON đã lưu
+    cached = (str(owner_id), public_or_not, QuizKey(stored['q'], stored['k']))
+    quiz_keys.set(quiz_id, cached, size=2 * estimate_size(stored))
+    return cached
+
+def read_submission(answers):
+    """Error message of an answers object {question_id: [answer ids] | text}, None when it is valid."""
+    if not isinstance(answers, dict):
+        return 'answers must be an object of question_id: answer ids (or text for Text_Fill)!'
+    for value in answers.values():
+        if isinstance(value, list):
+            if not all(isinstance(answer_id, str) for answer_id in value):
+                return 'Answer ids must be strings!'
+        elif not isinstance(value, str):
+            return 'Each answer must be a list of answer ids or a text!'
+    return None
+
+def snapshot_questions(stored_questions, contents):
+    """Questions of a quiz in the stored order as they were when it was generated, without correct flags.
+
+    Text_Fill questions are served without answers: their only answer is the correct one.
+    """
+    result = []
+    for (question_id, ids), (question_content, question_type, answer_contents) in zip(stored_questions, contents):
+        answers = []
+        if question_type != 'Text_Fill':
+            answers = [
+                {'answer_id': answer_id, 'answer_content': answer_content}
+                for answer_id, answer_content in zip(ids, answer_contents)
+            ]
+        result.append({
+            'question_id': question_id,
+            'question_content': question_content,
+            'type': question_type,
+            'answers': answers
+        })
+    return result
+
+# CREATE
+@quizzes.post("")
+@swag_from("../docs/quizzes/create.yaml")
+@user_token_required
+@set_id_required
+def create_quiz(user_id, set_id):
+    conn = None
+    cursor = None
+    try:
+        # Get question_count from request (optional)
+        question_count = request.json.get('question_count', DEFAULT_QUIZ_QUESTIONS)
+        if not validate_integer(question_count) or not 1 <= int(question_count) <= MAX_QUIZ_QUESTIONS:
+            ret = {
+                    'status': False,
+                    'message': f'question_count must be an integer between 1 and {MAX_QUIZ_QUESTIONS}!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+        question_count = int(question_count)
+
+        # Get seed from request (optional), the same seed and set give the same quiz
+        seed = request.json.get('seed')
+        if seed is None:
+            seed = random.getrandbits(63)
+        elif isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed < 2 ** 63:
+            ret = {
+                    'status': False,
+                    'message': 'Seed must be a non-negative 63-bit integer!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        public_or_not = request.json.get('public_or_not', False)
+        if not is_boolean(public_or_not):
+            ret = {
+                    'status': False,
+                    'message': 'public_or_not must be a boolean!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Check user, set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
+
+        if ownership.user_deleted:
+            ret = {
+                    'status': False,
+                    'message':'This user has been deleted!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        if not ownership.set_exists:
+            ret = {
+                'status':False,
+                'message':'This set is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        if ownership.set_deleted:
+            ret = {
+                'status':False,
+                'message':'This set has been deleted!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        if not ownership.is_owner:
+            ret = {
+                    'status': False,
+                    'message':'Sorry, permission denied!'
+                }
+            return jsonify(ret), HTTP_403_FORBIDDEN
+
+        # Sample questions and shuffle answers, everything is derived from the seed
+        rng = random.Random(seed)
+        question_ids = sample_question_ids(cursor, set_id, question_count, rng)
+        if not question_ids:
+            ret = {
+                'status':False,
+                'message':'This set has no question!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+        stored_questions, keys, contents = build_quiz(cursor, question_ids, rng)
+        if not stored_questions:
+            ret = {
+                'status':False,
+                'message':'This set has no question!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Save quiz: ids in the shuffled order, the answer keys and the content they were computed from
+        now = datetime.datetime.now()
+        cursor.execute(sql.SQL('''insert into public.quiz (created_at, updated_at, is_deleted, user_id, set_id, public_or_not, seed, question_count)
+                                  values (%s, %s, %s, %s, %s, %s, %s, %s) returning id'''),
+                       (now, now, False, user_id, set_id, public_or_not, seed, len(stored_questions)))
+        quiz_id = cursor.fetchone()[0]
+
+        cursor.execute(sql.SQL('''insert into public.quiz_question_answer (user_id, set_id, quiz_id, json_question_answer)
+                                  values (%s, %s, %s, %s)'''),
+                       (user_id, set_id, quiz_id, Json({'v': QUIZ_FORMAT_VERSION, 'q': stored_questions, 'k': keys, 'c': contents})))
+        conn.commit()
+
+        ret = {
+                'status': True,
+                'message':'Create new quiz successfully!',
+                'data': {
+                    'id': quiz_id,
+                    'set_id': set_id,
+                    'seed': seed,
+                    'question_count': len(stored_questions),
+                    'questions': snapshot_questions(stored_questions, contents)
+                }
+            }
+        return jsonify(ret), HTTP_201_CREATED
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "create_quiz").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# READ
+@quizzes.get("/<string:quiz_id>")
+@swag_from("../docs/quizzes/get.yaml")
+@user_token_required
+def get_quiz(user_id, quiz_id):
+    conn = None
+    cursor = None
+    try:
+        # Check if quiz_id is uuid type or not
+        if not is_valid_uuid(quiz_id):
+            ret = {
+                    'status': False,
+                    'message':'Type of quiz_id must is uuid!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(sql.SQL('''select q.user_id, q.set_id, q.public_or_not, q.seed, a.json_question_answer
+                                  from public.quiz q
+                                  join public.quiz_question_answer a
+                                  on a.quiz_id = q.id
+                                  where q.id = %s and q.is_deleted = false'''), (quiz_id, ))
+        quiz = cursor.fetchone()
+
+        if quiz is None:
+            ret = {
+                'status':False,
+                'message':'This quiz is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        owner_id, set_id, public_or_not, seed, stored = quiz
+
+        # Only the owner can take a private quiz
+        if str(owner_id) != str(user_id) and not public_or_not:
+            ret = {
+                    'status': False,
+                    'message':'Sorry, permission denied!'
+                }
+            return jsonify(ret), HTTP_403_FORBIDDEN
+
+        questions = snapshot_questions(stored['q'], stored['c'])
+        ret = {
+                'status': True,
+                'message':'Get quiz successfully!',
+                'data': {
+                    'id': quiz_id,
+                    'set_id': set_id,
+                    'seed': seed,
+                    'question_count': len(questions),
+                    'questions': questions
+                }
+            }
+        return jsonify(ret), HTTP_200_OK
+    except Exception as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "get_quiz").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# GRADE
+@quizzes.post("/<string:quiz_id>/grade")
+@swag_from("../docs/quizzes/grade.yaml")
+@user_token_required
+def grade_quiz(user_id, quiz_id):
+    conn = None
+    cursor = None
+    try:
+        # Check if quiz_id is uuid type or not
+        if not is_valid_uuid(quiz_id):
+            ret = {
+                    'status': False,
+                    'message':'Type of quiz_id must is uuid!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # One submission in answers, or many in submissions
+        body = request.get_json(silent=True) or {}
+        submissions = body.get('submissions')
+        single = submissions is None
+        if single:
+            submissions = [{'answers': body.get('answers')}]
+        elif not isinstance(submissions, list) or not 1 <= len(submissions) <= MAX_GRADE_BATCH:
+            ret = {
+                    'status': False,
+                    'message': f'submissions must be a list of 1 to {MAX_GRADE_BATCH} submissions!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        detail = body.get('detail', False)
+        if not is_boolean(detail):
+            ret = {
+                    'status': False,
+                    'message': 'detail must be a boolean!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        for position, submission in enumerate(submissions):
+            message = read_submission(submission.get('answers')) if isinstance(submission, dict) else 'Each submission must be an object!'
+            if message:
+                ret = {
+                        'status': False,
+                        'message': message if single else f'Submission {position}: {message}'
+                    }
+                return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        quiz = load_quiz_key(cursor, quiz_id)
+        if quiz is None:
+            ret = {
+                'status':False,
+                'message':'This quiz is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        owner_id, public_or_not, quiz_key = quiz
+
+        # Only the owner can grade a private quiz
+        if owner_id != str(user_id) and not public_or_not:
+            ret = {
+                    'status': False,
+                    'message':'Sorry, permission denied!'
+                }
+            return jsonify(ret), HTTP_403_FORBIDDEN
+
+        grades = quiz_key.grade_batch([submission['answers'] for submission in submissions], detail)
+        results = []
+        for submission, (score, correct) in zip(submissions, grades):
+            result = {'score': score}
+            if 'id' in submission:
+                result['id'] = submission['id']
+            if detail:
+                result['correct_question_ids'] = correct
+            results.append(result)
+
+        data = {'id': quiz_id, 'total': quiz_key.total}
+        if single:
+            data.update(results[0])
+        else:
+            data['results'] = results
+        ret = {
+                'status': True,
+                'message':'Grade quiz successfully!',
+                'data': data
+            }
+        return jsonify(ret), HTTP_200_OK
+    except Exception as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "grade_quiz").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
@@ -10,11 +10,192 @@ from error_handle import *
 from controller.auth_middleware import *
 import traceback
 import datetime
+import itertools
 from utils.validators import validate_email, validate_name, validate_integer, is_boolean, is_valid_uuid
 from utils.database import get_db_connection 
+from utils.guards import check_ownership
+from utils.queries import SET_DOCUMENT, SET_DOCUMENT_JSON, SETS_PAGE, SETS_PAGE_JSON, questions_page_query
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+from utils.search import KEYWORD_FILTER, RELEVANCE_EXPRESSION, keyword_params, highlight
+from utils.streaming import iter_server_side, ndjson_response
+from utils.cache import set_document_cache
+from utils.raw_json import SET_JSON_FROM_DB, raw_json_response
+from utils.etags import strong_etag, matching_etag
 
 sets = Blueprint("sets", __name__, url_prefix="/api/v1/sets")
 
+# Giới hạn số set trả về trong một trang
+MAX_SETS_PAGE_SIZE = 100
+
+# Giới hạn số question trả về trong một trang và các cột được phép sắp xếp
+MAX_QUESTIONS_PAGE_SIZE = 200
+QUESTION_SORT_COLUMNS = ['created_at', 'updated_at', 'content', 'type']
+
+# Extra functions
+def group_questions(rows):
+    """Group (question_id, question_content, answer_content, is_correct) rows ordered by question."""
+    questions = []
+    current_id = None
+
+    for question_id, question_content, answer_content, is_correct in rows:
+        if question_id != current_id:
+            current_id = question_id
+            questions.append({'question_content': question_content, 'answers': []})
+        # Question without any answer (left join)
+        if answer_content is None and is_correct is None:
+            continue
+        questions[-1]['answers'].append({'answer_content': answer_content, 'is_correct': is_correct})
+
+    return questions
+
+def load_set_document(cursor, set_id):
+    """Build the name/description/questions/answers document of a whole set."""
+    cursor.execute(SET_DOCUMENT, {'set_id': set_id})
+    questions_answers = cursor.fetchall()
+
+    if len(questions_answers) == 0:
+        return {}
+
+    return {
+        'name': questions_answers[0][0],
+        'description': questions_answers[0][1],
+        'questions': group_questions(item[2:] for item in questions_answers)
+    }
+
+def set_version_etag(cursor, set_id):
+    """Strong ETag of the whole-set document, without reading any content.
+
+    Every write to the set, its questions or its answers (soft deletes
+    included) moves updated_at, the live counts catch rows written within
+    the same timestamp.
+    """
+    query = sql.SQL('''select s.updated_at, q.max_updated_at, q.live, a.max_updated_at, a.live
+                        from public.set s
+                        cross join lateral (
+                            select max(b.updated_at) as max_updated_at, count(*) filter (where b.is_deleted is not true) as live
+                            from public.question b
+                            where b.set_id = s.id
+                        ) q
+                        cross join lateral (
+                            select max(c.updated_at) as max_updated_at, count(*) filter (where c.is_deleted is not true) as live
+                            from public.answer c
+                            join public.question b
+                            on b.id = c.question_id
+                            where b.set_id = s.id
+                        ) a
+                        where s.id = %s''')
+    cursor.execute(query, (set_id, ))
+    row = cursor.fetchone()
+    # The representation also depends on which path builds the JSON
+    return strong_etag(set_id, SET_JSON_FROM_DB, *row) if row else None
+
+def not_modified(etag):
+    """304 response when the client already has this version of the document, else None."""
+    matched = matching_etag(etag) if etag else None
+    if matched is None:
+        return None
+    response = Response(status=HTTP_304_NOT_MODIFIED)
+    response.set_etag(matched)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Câu hỏi của set với các đáp án, dạng JSON do Postgres dựng (cùng cấu trúc với group_questions)
+def load_set_document_json(cursor, set_id):
+    """JSON text of the same document as load_set_document, assembled by Postgres."""
+    cursor.execute(SET_DOCUMENT_JSON, {'set_id': set_id})
+    row = cursor.fetchone()
+    return row[0] if row else '{}'
+
+def load_sets_page_json(cursor, user_id, page_size, offset):
+    """(JSON text, has_more) of one page of sets of get_all_questions_of_all_sets, assembled by Postgres."""
+    cursor.execute(SETS_PAGE_JSON, {'user_id': user_id, 'limit': page_size, 'offset': offset})
+    return cursor.fetchone()
+
+def fetch_questions_page(cursor, set_id, page_size, sort_by='created_at', sort_direction='asc',
+                         after=None, offset=0, filters=None, params=None, sort_expression=None):
+    """Get one page of questions (with all of their answers) of a set.
+
+    Pages are cut on questions, never inside a question's answers. When after
+    is (sort_value, question_id) from a previous cursor the page starts right
+    after that question, so deep pages cost the same as the first one.
+    sort_expression replaces the sort column by an SQL expression (relevance).
+    Return (name, description, questions, next_cursor).
+    """
+    query_params = dict(params or {})
+    query_params.update({'set_id': set_id, 'limit': page_size + 1, 'offset': offset})
+    if after is not None:
+        query_params['after_value'], query_params['after_id'] = after
+
+    query = questions_page_query(sort_by, sort_direction, sort_expression, filters, keyset=after is not None)
+    cursor.execute(query, query_params)
+    rows = cursor.fetchall()
+
+    if not rows:
+        return None, None, [], None
+
+    name, description = rows[0][0], rows[0][1]
+    rows = [item for item in rows if item[2] is not None]
+
+    # Positions (sort value, id) of questions in the page, in order
+    positions = []
+    for item in rows:
+        if not positions or positions[-1][1] != item[2]:
+            positions.append((item[4], item[2]))
+
+    next_cursor = None
+    if len(positions) > page_size:
+        # One more question than asked: drop it and point the cursor at the last kept question
+        extra_id = positions[page_size][1]
+        rows = [item for item in rows if item[2] != extra_id]
+        last_value, last_id = positions[page_size - 1]
+        next_cursor = encode_cursor(sort_by, last_value, last_id, sort_direction)
+
+    questions = group_questions((item[2], item[3], item[5], item[6]) for item in rows)
+    return name, description, questions, next_cursor
+
+def iter_question_documents(rows):
+    """Turn ordered (set_id, set_name, question_id, question_content, type, answer_content, is_correct)
+    rows into one dict per question, without holding more than one question in memory."""
+    current = None
+
+    for set_id, set_name, question_id, question_content, question_type, answer_content, is_correct in rows:
+        if current is None or current['question_id'] != question_id:
+            if current is not None:
+                yield current
+            current = {
+                'set_id': set_id,
+                'set_name': set_name,
+                'question_id': question_id,
+                'question_content': question_content,
+                'type': question_type,
+                'answers': []
+            }
+        if answer_content is None and is_correct is None:
+            continue
+        current['answers'].append({'answer_content': answer_content, 'is_correct': is_correct})
+
+    if current is not None:
+        yield current
+
+def read_page_arguments(default_page_size, sort_columns=QUESTION_SORT_COLUMNS, default_sort='created_at', default_direction='asc'):
+    """Read page_size / cursor / sort arguments shared by the question listing routes."""
+    page_size = request.args.get('page_size', default=default_page_size, type=int)
+    sort_by = request.args.get('sort_by', default=default_sort, type=str)
+    sort_direction = request.args.get('sort_direction', default=default_direction, type=str)
+
+    if page_size is None or page_size < 1 or page_size > MAX_QUESTIONS_PAGE_SIZE:
+        raise InvalidCursor(f'page_size must be between 1 and {MAX_QUESTIONS_PAGE_SIZE}!')
+    if sort_by not in sort_columns:
+        raise InvalidCursor('Invalid sort_by!')
+    if sort_direction not in ['asc', 'desc']:
+        raise InvalidCursor('Invalid sort_direction!')
+
+    after = None
+    if request.args.get('cursor'):
+        after = decode_cursor(request.args.get('cursor'), sort_by, sort_direction)
+
+    return page_size, sort_by, sort_direction, after
+
 # CREATE
 @sets.post("")
 @swag_from("../docs/sets/create.yaml")
@@ -39,11 +220,8 @@ def create_set(user_id):
             description = request.json['description']
         
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        is_deleted = cursor.fetchone()
-        if not is_deleted:
+        ownership = check_ownership(cursor, user_id)
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
@@ -112,24 +290,27 @@ def update_set(user_id, set_id = None):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST 
 
+        # Check user, set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        user_deleted = cursor.fetchone()
-        if not user_deleted[0]:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        # Check if set is deleted
-        query2 = sql.SQL('''select is_deleted from public.set where id = %s''')
-        cursor.execute(query2, (set_id, ))
+        # Check if set is not exist
+        if not ownership.set_exists:
+            ret = {
+                'status':False,
+                'message':'This set is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        set_deleted = cursor.fetchone()
-        if not set_deleted[0]:
+        # Check if set is deleted
+        if ownership.set_deleted:
             ret = {
                 'status': False,
                 'message': 'This set has been deleted!'
@@ -137,11 +318,7 @@ def update_set(user_id, set_id = None):
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
         # Check if user isn't owner of this set
-        query3 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query3, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -203,24 +380,27 @@ def delete_set(user_id, set_id = None):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
 
+        # Check user, set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
+
         # Check if user is deleted
-        query1 = sql.SQL('''select is_deleted from public."user" where id = %s''')
-        cursor.execute(query1, (user_id, ))
-        
-        is_deleted = cursor.fetchone()
-        if not is_deleted:
+        if ownership.user_deleted:
             ret = {
                     'status': False,
                     'message':'Set owner has been deleted!'
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
+        # Check if set is not exist
+        if not ownership.set_exists:
+            ret = {
+                'status':False,
+                'message':'This set is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        # Check if user isn't owner of this set
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
@@ -228,8 +408,8 @@ def delete_set(user_id, set_id = None):
             return jsonify(ret), HTTP_403_FORBIDDEN
         
         # Update set information
-        query3 = sql.SQL('''update public.set set is_deleted = %s where id = %s''')
-        cursor.execute(query3, (True, set_id))
+        query3 = sql.SQL('''update public.set set is_deleted = %s, updated_at = %s where id = %s''')
+        cursor.execute(query3, (True, datetime.datetime.now(), set_id))
         conn.commit()
 
         # Return response
@@ -270,20 +450,18 @@ def get_all_questions_of_set(user_id, set_id):
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST  
     
-        # Check if set is not exist or is deleted 
-        query1 = sql.SQL('''select is_deleted from public.set where id = %s''')
-        cursor.execute(query1, (set_id, ))
-
-        check_deleted = cursor.fetchone()
+        # Check set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
 
-        if check_deleted is None:
+        # Check if set is not exist or is deleted 
+        if not ownership.set_exists:
             ret = {
                 'status':False,
                 'message':'This set is not exist!'
             }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        if check_deleted[0]: 
+        if ownership.set_deleted: 
             ret = {
                 'status':False,
                 'message':'This set has been deleted!'
@@ -291,74 +469,76 @@ def get_all_questions_of_set(user_id, set_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
     
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''select * from public.set where user_id = %s and id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is not None and len(check_owner) == 0:
+        if not ownership.is_owner:
             ret = {
                     'status': False,
                     'message':'Sorry, permission denied!'
                 }
             return jsonify(ret), HTTP_403_FORBIDDEN
-        
-        # Get all questions and answers
-        query3 = sql.SQL('''select a.name, a.description, b.content, c.content, c.is_correct  
-                        from public.set a 
-                        join public.question b 
-                        on a.id = b.set_id and b.set_id = %s and b.is_deleted != true
-                        join public.answer c
-                        on b.id = c.question_id and c.is_deleted != true
-                        ''')
-        
-        cursor.execute(query3, (set_id, ))
-        questions_answers = cursor.fetchall()
 
-        if questions_answers is None:
-            ret = {
+        # Large sets can be read page by page (page_size / cursor)
+        if 'page_size' in request.args or 'cursor' in request.args:
+            try:
+                page_size, sort_by, sort_direction, after = read_page_arguments(50)
+            except InvalidCursor as e:
+                ret = {
                     'status': False,
-                    'message':'Get all questions and answers failed!'
+                    'message': str(e)
                 }
-            return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
-        
-        # Initialize ret if get questions_answers from database successfully
-        ret = {
-                'status': True,
-                'message':'Get all questions and answers successfully!',
-                'data': {}
-            }
-        
-        if len(questions_answers) == 0:
-            return jsonify(ret), HTTP_200_OK
-
-        # Get set name 
-        ret['data']['name'] = questions_answers[0][0]
+                return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        # Get set description
-        ret['data']['description'] = questions_answers[0][1]
+            name, description, questions, next_cursor = fetch_questions_page(cursor, set_id, page_size, sort_by, sort_direction, after)
 
-        # Initialize list of question
-        ret['data']['questions'] = []
-
-        # Get all questions and answers
-        question_content = ''
-        answers_infors = []
+            ret = {
+                    'status': True,
+                    'message':'Get all questions and answers successfully!',
+                    'data': {
+                        'name': name,
+                        'description': description,
+                        'questions': questions
+                    },
+                    'next_cursor': next_cursor
+                }
+            return jsonify(ret), HTTP_200_OK
 
-        for idx, item in enumerate(questions_answers):
-            if question_content == '':
-                question_content = item[2]
-                answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-            elif item[2] != question_content:
-                ret['data']['questions'].append({'question_content': question_content, 'answers': answers_infors})
-                answers_infors = [{'question_content': item[3], 'is_correct': item[4]}]
-                question_content = item[2]
+        # Answer 304 before building the document when the client has the current version
+        etag = set_version_etag(cursor, set_id)
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        # Serve the assembled document from the cache while the set has not changed: the
+        # cache is keyed by the ETag, read from the database, so every worker agrees on it.
+        # Without an ETag (set removed meanwhile) the document is built without the cache.
+        document = set_document_cache.get(set_id, etag) if etag else None
+        if document is None:
+            if SET_JSON_FROM_DB:
+                document = load_set_document_json(cursor, set_id)
             else:
-                answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-
-            if idx == len(questions_answers) - 1:
-                ret['data']['questions'].append({'question_content': question_content, 'answers': answers_infors})
+                document = load_set_document(cursor, set_id)
+            # Filled only for the ETag it is served with
+            if etag:
+                set_document_cache.set(set_id, etag, document)
+
+        # JSON text from Postgres goes into the body without being parsed
+        if SET_JSON_FROM_DB:
+            response = raw_json_response({
+                    'status': True,
+                    'message':'Get all questions and answers successfully!'
+                }, document, HTTP_200_OK)
+        else:
+            ret = {
+                    'status': True,
+                    'message':'Get all questions and answers successfully!',
+                    'data': document
+                }
+            response = jsonify(ret)
 
-        return jsonify(ret), HTTP_200_OK
+        # Clients revalidate with If-None-Match on every read
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response, HTTP_200_OK
     except Exception as e:
         ret = {
             'status': False,
@@ -382,66 +562,53 @@ def get_all_questions_of_all_sets(user_id):
         conn = get_db_connection()
         cursor = conn.cursor()  
 
-        # Query to get all set_ids
-        query1 = sql.SQL('''select distinct(id) from public."set" where user_id = %s and is_deleted != true''')
-        cursor.execute(query1, (user_id, ))
-        all_ids = cursor.fetchall()
+        # Set-level pagination
+        page = request.args.get('page', default=1, type=int)
+        page_size = request.args.get('page_size', default=20, type=int)
+
+        if page < 1 or page_size < 1 or page_size > MAX_SETS_PAGE_SIZE:
+            ret = {
+                'status': False,
+                'message': f'Page must be positive and page_size must be between 1 and {MAX_SETS_PAGE_SIZE}!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        set_ids = [id[0] for id in all_ids]
+        # Postgres assembles the whole page as JSON text
+        if SET_JSON_FROM_DB:
+            data_json, has_more = load_sets_page_json(cursor, user_id, page_size, (page - 1) * page_size)
+            return raw_json_response({
+                    'status': True,
+                    'message':'Get all sets and questions and answers successfully!',
+                    'page': page,
+                    'page_size': page_size,
+                    'has_more': has_more
+                }, data_json, HTTP_200_OK)
+
+        # Get one page of sets with all of their questions and answers in a single query
+        cursor.execute(SETS_PAGE, {'user_id': user_id, 'limit': page_size, 'offset': (page - 1) * page_size})
+        questions_answers = cursor.fetchall()
 
         # Initialize ret if get questions_answers from database successfully
         ret = {
                 'status': True,
                 'message':'Get all sets and questions and answers successfully!',
+                'page': page,
+                'page_size': page_size,
+                'has_more': questions_answers[0][0] if questions_answers else False,
                 'data': []
             }
-        
-        for set_id in set_ids:
-            # Get all questions and answers
-            query2 = sql.SQL('''select a.name, a.description, b.content, c.content, c.is_correct  
-                        from public.set a 
-                        join public.question b 
-                        on a.id = b.set_id and b.set_id = %s and b.is_deleted != true
-                        join public.answer c
-                        on b.id = c.question_id and c.is_deleted != true
-                        ''')
-        
-            cursor.execute(query2, (set_id, ))
-            questions_answers = cursor.fetchall()
 
-            if questions_answers is None or len(questions_answers) == 0:
+        # Rows are ordered by set, so each set is a contiguous group
+        for set_id, set_rows in itertools.groupby(questions_answers, key=lambda item: item[1]):
+            set_rows = list(set_rows)
+            # Set without any question (left join)
+            if set_rows[0][4] is None:
                 continue
-
-            set_dict = {}
-
-            # Get set name 
-            set_dict['name'] = questions_answers[0][0]
-
-            # Get set description
-            set_dict['description'] = questions_answers[0][1]
-
-            # Initialize list of question
-            set_dict['questions'] = []
-
-            # Get all questions and answers
-            question_content = ''
-            answers_infors = []
-
-            for idx, item in enumerate(questions_answers):
-                if question_content == '':
-                    question_content = item[2]
-                    answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-                elif item[2] != question_content:
-                    set_dict['questions'].append({'question_content': question_content, 'answers': answers_infors})
-                    answers_infors = [{'question_content': item[3], 'is_correct': item[4]}]
-                    question_content = item[2]
-                else:
-                    answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-
-                if idx == len(questions_answers) - 1:
-                    set_dict['questions'].append({'question_content': question_content, 'answers': answers_infors})
-
-            ret['data'].append(set_dict)
+            ret['data'].append({
+                'name': set_rows[0][2],
+                'description': set_rows[0][3],
+                'questions': group_questions(item[4:] for item in set_rows)
+            })
 
         return jsonify(ret), HTTP_200_OK
     except Exception as e:
@@ -478,20 +645,18 @@ def search(user_id):
         conn = get_db_connection()
         cursor = conn.cursor()  
         
-        # Check if set is not exist or is deleted 
-        query1 = sql.SQL('''SELECT is_deleted FROM public.set WHERE id = %s''')
-        cursor.execute(query1, (set_id, ))
+        # Check set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
 
-        check_deleted = cursor.fetchone()
-
-        if check_deleted is None:
+        # Check if set is not exist or is deleted 
+        if not ownership.set_exists:
             ret = {
                 'status': False,
                 'message': 'This set does not exist!'
             }
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
-        if check_deleted[0]: 
+        if ownership.set_deleted: 
             ret = {
                 'status': False,
                 'message': 'This set has been deleted!'
@@ -499,112 +664,177 @@ def search(user_id):
             return jsonify(ret), HTTP_400_BAD_REQUEST
         
         # Check if user isn't owner of this set
-        query2 = sql.SQL('''SELECT * FROM public.set WHERE user_id = %s AND id = %s''')
-        cursor.execute(query2, (user_id, set_id))
-
-        check_owner = cursor.fetchone()
-        if check_owner is None:
+        if not ownership.is_owner:
             ret = {
                 'status': False,
                 'message': 'Sorry, permission denied!'
             }
             return jsonify(ret), HTTP_403_FORBIDDEN
         
-        # Pagination and Filtering
+        keyword = request.args.get('keyword', default='', type=str).strip()
+
+        # Pagination and Filtering (keyword searches are sorted by relevance unless sort_by is sent)
+        try:
+            if keyword:
+                page_size, sort_by, sort_direction, after = read_page_arguments(
+                    50, QUESTION_SORT_COLUMNS + ['relevance'], 'relevance', 'desc'
+                )
+            else:
+                page_size, sort_by, sort_direction, after = read_page_arguments(50)
+        except InvalidCursor as e:
+            ret = {
+                'status': False,
+                'message': str(e)
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
         page = request.args.get('page', default=1, type=int)
-        page_size = request.args.get('page_size', default=50, type=int)
-        keyword = request.args.get('keyword', default='', type=str)
         question_type = request.args.get('question_type', default='', type=str)
-        sort_by = request.args.get('sort_by', default='created_at', type=str)
-        sort_direction = request.args.get('sort_direction', default='asc', type=str)
 
-        offset = (page - 1) * page_size # example: page = 2, page_size = 50 -> offset = (2 - 1)*50 = 50 -> get records from 51 -> 100
-        
-        # Chú ý: số lượng phần tử có chứa %s (format string) phải bằng độ dài list query_params,
-        # sau này sẽ dùng từng phần tử trong query_params để map tới từng format string để add vào query tổng
-        query_params = [set_id]
-        filters = ["b.set_id = %s", "b.is_deleted != true", "c.is_deleted != true"]
+        # Old clients still send page: it is an offset over questions, the cursor is preferred
+        offset = 0
+        if after is None and page and page > 1:
+            offset = (page - 1) * page_size
+
+        # Mỗi điều kiện trong filters dùng tham số có tên, giá trị được lưu trong query_params
+        query_params = {}
+        filters = []
 
         # Kiểm tra xem điều kiện search có keyword không, nếu có thì thêm vào cả filters và query_params
+        # (full-text + trigram, không phân biệt dấu, xem utils/search.py)
         if keyword:
-            filters.append("(b.content ILIKE %s OR EXISTS (SELECT 1 FROM public.answer WHERE question_id = b.id AND content ILIKE %s))")
-            query_params.append(f"%{keyword}%") # map vào %s đầu tiên trong (b.content ILIKE %s OR c.content ILIKE %s)
-            query_params.append(f"%{keyword}%") # map vào %s thứ hai trong (b.content ILIKE %s OR c.content ILIKE %s)
-        
+            filters.append(KEYWORD_FILTER)
+            query_params.update(keyword_params(keyword))
+
         # Kiểm tra xem điều kiện search có question không, nếu có thì thêm vào cả filters và query_params
         if question_type:
-            filters.append("b.type = %s")
-            query_params.append(question_type)
-        
-        sort_column = sql.Identifier('b', sort_by)
-        sort_order = sql.SQL('ASC') if sort_direction == 'asc' else sql.SQL('DESC')
-
-        query3 = sql.SQL('''SELECT a.name, a.description, b.content AS question_content, c.content AS answer_content, c.is_correct  
-                            FROM public.set a 
-                            JOIN public.question b ON a.id = b.set_id
-                            JOIN public.answer c ON b.id = c.question_id
-                            WHERE {} 
-                            ORDER BY {} {}
-                            LIMIT %s OFFSET %s''').format(
-            sql.SQL(' AND ').join(map(sql.SQL, filters)),
-            sort_column,
-            sort_order
-        )
-
-        print(query3)
+            filters.append("b.type = %(question_type)s")
+            query_params['question_type'] = question_type
 
-        query_params.extend([page_size, offset])
+        name, description, questions, next_cursor = fetch_questions_page(
+            cursor, set_id, page_size, sort_by, sort_direction, after, offset, filters, query_params,
+            RELEVANCE_EXPRESSION if sort_by == 'relevance' else None
+        )
 
-        cursor.execute(query3, query_params)
-        questions_answers = cursor.fetchall()
+        # Highlight matches of the keyword in questions and answers
+        if keyword:
+            for question in questions:
+                question['question_highlight'] = highlight(question['question_content'], keyword)
+                for answer in question['answers']:
+                    answer['answer_highlight'] = highlight(answer['answer_content'], keyword)
 
         ret = {
             'status': True,
             'message': 'Get all questions and answers successfully!',
-            'data': {}
+            'data': {
+                'name': name,
+                'description': description if questions else '',
+                'questions': questions
+            },
+            'next_cursor': next_cursor
         }
 
-        if questions_answers:
-            # Get name's description
-            ret['data']['name'] = questions_answers[0][0]
-
-            # Get set's description
-            ret['data']['description'] = questions_answers[0][1]
-
-            # Initialize list of question
-            ret['data']['questions'] = []
-
-            # Get all questions and answers
-            question_content = ''
-            answers_infors = []
-
-            for idx, item in enumerate(questions_answers):
-                if question_content == '':
-                    question_content = item[2]
-                    answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-                elif item[2] != question_content:
-                    ret['data']['questions'].append({'question_content': question_content, 'answers': answers_infors})
-                    answers_infors = [{'answer_content': item[3], 'is_correct': item[4]}]
-                    question_content = item[2]
-                else:
-                    answers_infors.append({'answer_content': item[3], 'is_correct': item[4]})
-
-                if idx == len(questions_answers) - 1:
-                    ret['data']['questions'].append({'question_content': question_content, 'answers': answers_infors})
-        else:
-            ret['data']['description'] = ''
-            ret['data']['questions'] = []
-
         return jsonify(ret), HTTP_200_OK
     except Exception as e:
         ret = {
             'status': False,
             'message': str(e)
         }
-        traceback.print_exc()  # Log lỗi ra console để debug
+        Systemp_log(traceback.format_exc(), "search").append_new_line()
         return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
     finally:
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+# EXPORT (stream questions with their answers as NDJSON, one question per line)
+@sets.get("/<string:set_id>/export")
+@swag_from("../docs/sets/export.yaml")
+@user_token_required
+def export_set(user_id, set_id):
+    conn = None
+    cursor = None
+    try:
+        # Check if set_id is uuid type or not
+        if not is_valid_uuid(set_id):
+            ret = {
+                    'status': False,
+                    'message':'Type of set_id must is uuid!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Check set and ownership in one query
+        ownership = check_ownership(cursor, user_id, set_id)
+
+        if not ownership.set_exists:
+            ret = {
+                'status':False,
+                'message':'This set is not exist!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        if ownership.set_deleted:
+            ret = {
+                'status':False,
+                'message':'This set has been deleted!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        if not ownership.is_owner:
+            ret = {
+                    'status': False,
+                    'message':'Sorry, permission denied!'
+                }
+            return jsonify(ret), HTTP_403_FORBIDDEN
+
+        query = sql.SQL('''select s.id, s.name, b.id, b.content, b.type, c.content, c.is_correct
+                            from public.set s
+                            join public.question b
+                            on b.set_id = s.id and b.is_deleted != true
+                            left join public.answer c
+                            on c.question_id = b.id and c.is_deleted != true
+                            where s.id = %s
+                            order by b.created_at, b.id, c.created_at, c.id''')
+
+        rows = iter_server_side(query, (set_id, ))
+        return ndjson_response(iter_question_documents(rows))
+    except Exception as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "export_set").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+
+@sets.get("/export")
+@swag_from("../docs/sets/export_all.yaml")
+@user_token_required
+def export_all_sets(user_id):
+    try:
+        # The rows are read on a connection of their own while the body is streamed
+        query = sql.SQL('''select s.id, s.name, b.id, b.content, b.type, c.content, c.is_correct
+                            from public.set s
+                            join public.question b
+                            on b.set_id = s.id and b.is_deleted != true
+                            left join public.answer c
+                            on c.question_id = b.id and c.is_deleted != true
+                            where s.user_id = %s and s.is_deleted != true
+                            order by s.created_at, s.id, b.created_at, b.id, c.created_at, c.id''')
+
+        rows = iter_server_side(query, (user_id, ))
+        return ndjson_response(iter_question_documents(rows))
+    except Exception as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "export_all_sets").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
\ No newline at end of file
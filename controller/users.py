@@ -1,4 +1,4 @@
-from constants.http_status_code import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_409_CONFLICT
+from constants.http_status_code import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, HTTP_409_CONFLICT, HTTP_429_TOO_MANY_REQUESTS, HTTP_500_INTERNAL_SERVER_ERROR
 from flask import *
 from flask import Blueprint, request, jsonify, current_app, session
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -8,75 +8,52 @@ from database import *
 from psycopg2 import sql
 from error_handle import *
 from controller.auth_middleware import *
-import bcrypt
 import jwt
+import uuid
 import traceback
 import datetime
+import json
+import os
 from utils.validators import validate_email, validate_name, validate_integer
 from utils.database import get_db_connection
+from utils.passwords import password_hasher, HasherBusy
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+from utils.streaming import iter_server_side, ndjson_response
+from utils.queries import USER_BY_EMAIL, users_page_query, where_clause
 
 users = Blueprint("user", __name__, url_prefix="/api/v1/users")
 
-# Extra functions
-def check_exist(email):
-    conn = None
-    cursor = None
-
-    try:
-        # Create connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Query
-        query = '''SELECT * FROM public."user" WHERE email = %s'''
-        
-        # Check email is registered or not
-        cursor.execute(query, (email,))
-        user_list = cursor.fetchall()
-        
-        if len(user_list) > 0:
-            return True
-        return False
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(f"Error: {error}")
-        return False
-    finally:
-        # Close connection
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
-
-def add_user(email, password, name, role):
-    conn = None
-    cursor = None
+MAX_USERS_PAGE_SIZE = 500
 
-    try:
-        # Create connection
-        conn = get_db_connection
-        cursor = conn.cursor()
+# Dưới ngưỡng này count(*) đủ nhanh, trên ngưỡng thì dùng số ước lượng của planner
+USERS_EXACT_COUNT_LIMIT = int(os.getenv('USERS_EXACT_COUNT_LIMIT', 10000))
 
-        # Insert user information to table "user" 
-        query = sql.SQL('''INSERT INTO public."user"(name, email, password, role, created_at, updated_at, is_deleted) VALUES (%s, %s, %s, %s, %s, %s, %s)''')
-        cursor.execute(query, (name, email, password, role, datetime.datetime.now(), datetime.datetime.now(), False))
-        conn.commit()
-
-        return True
-    except (Exception, psycopg2.IntegrityError) as error:
-        print(f"Error: {error}")
-        Systemp_log(traceback.format_exc(), "add_user").append_new_line()
-        conn.rollback()  # Rollback in case of error
-        return False
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+# Extra functions
+def find_login_user(cursor, email):
+    """(id, password hash, role, is_deleted) of the user with this email, None if not registered.
+
+    One lookup on the unique email index (user_email_key).
+    """
+    cursor.execute(USER_BY_EMAIL, {'email': email})
+    return cursor.fetchone()
+
+def add_user(cursor, email, password, name, role):
+    """Insert the user, return its id or None when the email was registered in the meantime."""
+    query = sql.SQL('''insert into public."user" (name, email, password, role, created_at, updated_at, is_deleted)
+                        values (%s, %s, %s, %s, %s, %s, %s)
+                        on conflict (email) do nothing
+                        returning id''')
+    now = datetime.datetime.now()
+    cursor.execute(query, (name, email, password, role, now, now, False))
+    row = cursor.fetchone()
+    return row[0] if row else None
     
 # CREATE
 @users.post("/register")
 @swag_from("../docs/users/create.yaml")
 def create_user():
+    conn = None
+    cursor = None
     try:
         # Get data from request
         name = request.json['name']
@@ -113,44 +90,127 @@ def create_user():
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        # Check if the email is used to register another account?
-        if check_exist(email):
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Check if the email is used to register another account? (before paying for bcrypt)
+        if find_login_user(cursor, email):
             ret = {
                     'status': False,
                     'message':'This email has already registered!'
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
-        # Converting password to array of bytes 
-        bytes = password.encode('utf-8') 
+        # Hashing the password (on the bcrypt worker pool)
+        hash_password = password_hasher.hash(password)
 
-        # Generating the salt 
-        salt = bcrypt.gensalt() 
-        
-        # Hashing the password 
-        hash_password = bcrypt.hashpw(bytes, salt)
-
-        if add_user(email, hash_password.decode('utf-8'), name, role):
+        # on conflict handles two registrations of the same email at the same time
+        if add_user(cursor, email, hash_password, name, role) is None:
+            conn.rollback()
             ret = {
-                    'status': True,
-                    'message':'Register new account successfully!'
+                    'status': False,
+                    'message':'This email has already registered!'
                 }
-            return jsonify(ret), HTTP_201_CREATED
-        
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+        conn.commit()
+
         ret = {
-                'status': False,
-                'message':'Server error or run query not successfully!'
+                'status': True,
+                'message':'Register new account successfully!'
             }
-        
-        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+        return jsonify(ret), HTTP_201_CREATED
+    except HasherBusy as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        return jsonify(ret), HTTP_429_TOO_MANY_REQUESTS, {'Retry-After': '1'}
     except Exception as e:
+        if conn:
+            conn.rollback()
         ret = {
             'status': False,
             'message': str(e)
         }
+        Systemp_log(traceback.format_exc(), "create_user").append_new_line()
         return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
 
 # READ
+def read_user_filters():
+    """SQL conditions and named parameters of the role / deleted / created_from / created_to arguments.
+
+    Raise ValueError when one of them is invalid.
+    """
+    filters = []
+    params = {}
+
+    role = request.args.get('role')
+    if role is not None:
+        if not validate_integer(role):
+            raise ValueError('Role must be an integer!')
+        filters.append('role = %(role)s')
+        params['role'] = int(role)
+
+    deleted = request.args.get('deleted', default='all', type=str).lower()
+    if deleted == 'true':
+        filters.append('is_deleted = true')
+    elif deleted == 'false':
+        filters.append('is_deleted is not true')
+    elif deleted != 'all':
+        raise ValueError('Deleted must be true, false or all!')
+
+    for name, condition in (('created_from', 'created_at >= %(created_from)s'), ('created_to', 'created_at < %(created_to)s')):
+        value = request.args.get(name)
+        if value is not None:
+            try:
+                params[name] = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'{name} must be an ISO 8601 date or datetime!')
+            filters.append(condition)
+
+    return filters, params
+
+def count_users(cursor, filters, params):
+    """(total, is_estimate) of the users matching filters.
+
+    count(*) reads every matching row, so it is only used when the planner
+    expects at most USERS_EXACT_COUNT_LIMIT rows; above that the estimate
+    (pg_class.reltuples without filters, the EXPLAIN row estimate with
+    filters) is returned instead.
+    """
+    if filters:
+        cursor.execute('explain (format json) select 1 from public."user" ' + where_clause(filters), params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+    else:
+        # reltuples = -1 until the table has been analyzed once
+        cursor.execute("select reltuples::bigint from pg_class where oid = 'public.\"user\"'::regclass")
+        estimate = cursor.fetchone()[0]
+
+    if estimate <= USERS_EXACT_COUNT_LIMIT:
+        cursor.execute('select count(*) from public."user" ' + where_clause(filters), params)
+        return cursor.fetchone()[0], False
+    return estimate, True
+
+def user_document(row):
+    user_id, email, name, role, is_deleted, created_at = row
+    return {
+        'id': user_id,
+        'email': email.strip() if email else email,
+        'name': name,
+        'role': role,
+        'is_deleted': is_deleted,
+        'created_at': created_at
+    }
+
 @users.get("")
 @swag_from("../docs/users/users_infor.yaml")
 @token_required
@@ -159,40 +219,56 @@ def get_users_infor():
     cursor = None
 
     try:
+        # Keyset pagination on (created_at, id), cursor is the position after the last user of the previous page
+        page_size = request.args.get('page_size', default=50, type=int)
+        if page_size < 1 or page_size > MAX_USERS_PAGE_SIZE:
+            ret = {
+                'status': False,
+                'message': f'page_size must be between 1 and {MAX_USERS_PAGE_SIZE}!'
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        try:
+            filters, params = read_user_filters()
+            if request.args.get('cursor'):
+                params['after_created_at'], params['after_id'] = decode_cursor(request.args.get('cursor'), 'created_at')
+        except (ValueError, InvalidCursor) as e:
+            ret = {
+                'status': False,
+                'message': str(e)
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
         # Create connection
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        # Get all user in table "user"
-        cursor.execute('''select email, name, role from public."user"''')
+        page_filters = list(filters)
+        if 'after_id' in params:
+            page_filters.append('(created_at, id) > (%(after_created_at)s, %(after_id)s::uuid)')
+        params['limit'] = page_size + 1
+
+        # One more row than the page tells whether there is a next page
+        cursor.execute(users_page_query(page_filters), params)
         all_users = cursor.fetchall()
-        
-        # If has not any user
-        if all_users is None:
-            ret = {
-                'status':False,
-                'message':'Run query not successfully!'
-            }
-            return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
-        
+
+        next_cursor = None
+        if len(all_users) > page_size:
+            all_users = all_users[:page_size]
+            next_cursor = encode_cursor('created_at', all_users[-1][5], all_users[-1][0])
+
         ret = {
                 'status':True,
                 'message':'Get all users information succesfully!',
-                'data':[]
+                'data': [user_document(item) for item in all_users],
+                'next_cursor': next_cursor
             }
-        
-        if len(all_users) == 0:
-            ret['data'] = None
-            return jsonify(ret), HTTP_200_OK
-        
-        for item in all_users:
-            ret['data'].append({
-                'email':item[0].strip(),
-                'name':item[1],
-                'role':item[2]
-            })
-            
-        return jsonify(ret)
+
+        # Total of users matching the filters (not only this page), only when asked
+        if request.args.get('count', default='false', type=str).lower() == 'true':
+            ret['total'], ret['total_is_estimate'] = count_users(cursor, filters, params)
+
+        return jsonify(ret), HTTP_200_OK
     except Exception as e:
         ret = {
             'status': False,
@@ -206,6 +282,33 @@ def get_users_infor():
         if conn:
             conn.close()
 
+@users.get("/export")
+@swag_from("../docs/users/export.yaml")
+@token_required
+def export_users():
+    try:
+        try:
+            filters, params = read_user_filters()
+        except ValueError as e:
+            ret = {
+                'status': False,
+                'message': str(e)
+            }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+
+        # Server-side cursor on a connection of its own: only one batch of users is in memory at a time
+        query = sql.SQL('select id, email, name, role, is_deleted, created_at from public."user" '
+                        + where_clause(filters) + ' order by created_at, id')
+        rows = iter_server_side(query, params)
+        return ndjson_response(user_document(row) for row in rows)
+    except Exception as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "export_users").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+
 @users.post("/login")
 @swag_from("../docs/users/login.yaml")
 def login():
@@ -228,46 +331,59 @@ def login():
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
 
+        # Get id, hash of password, role and is_deleted by email in one query
+        user = find_login_user(cursor, email)
+
         # If email has not registered yet
-        if not check_exist(email):
+        if user is None:
             ret = {
                     'status': False,
                     'message':'Email or password is incorrect!'
                 }
             return jsonify(ret), HTTP_400_BAD_REQUEST
+        user_id, hash_password, role, is_deleted = user
 
-        # Encoding user password
-        hash_password = password.encode('utf-8')
-
-        # Get hash of password from database by email
-        query = sql.SQL('''select email, password, role from public."user" where email = %s''')
-        cursor.execute(query, (email, ))
-        hash_pw_role = cursor.fetchone()
-
-        if len(hash_pw_role) == 0:
-            return jsonify({
-                            'status':False,
-                            'message':'Username or password is incorrect!'
-                            }), HTTP_400_BAD_REQUEST 
-
-        # checking password
-        result = bcrypt.checkpw(hash_password, hash_pw_role[1].encode('utf-8'))
+        # checking password (on the bcrypt worker pool)
+        result = password_hasher.verify(password, hash_password)
         
         if result:
+            # Soft-deleted account: checked after the password so the answer does not tell whether the email is registered
+            if is_deleted:
+                ret = {
+                        'status': False,
+                        'message':'This user has been deleted!'
+                    }
+                return jsonify(ret), HTTP_400_BAD_REQUEST
+
             session['logged_in'] = True
 
+            # Hash again with the configured cost factor, the password is only known here
+            if password_hasher.needs_rehash(hash_password):
+                try:
+                    cursor.execute(
+                        sql.SQL('''update public."user" set password = %s, updated_at = %s where id = %s'''),
+                        (password_hasher.hash(password), datetime.datetime.now(), user_id)
+                    )
+                    conn.commit()
+                    password_hasher.count('rehashed')
+                except HasherBusy:
+                    # Try again on the next login
+                    pass
+                except Exception:
+                    # The password is right, the old hash keeps working: log and try again on the next login
+                    conn.rollback()
+                    Systemp_log(traceback.format_exc(), "login_rehash").append_new_line()
+
+            # user_id và is_deleted là claim đã ký, user_token_required không cần query lại
             token = jwt.encode({
-                'email': hash_pw_role[0],
-                'role': hash_pw_role[2],
-                'expiration': (datetime.datetime.now() + datetime.timedelta(hours=12)).timestamp()
+                'email': email,
+                'role': role,
+                'user_id': str(user_id),
+                'is_deleted': bool(is_deleted),
+                'jti': uuid.uuid4().hex,
+                'expiration': (datetime.datetime.now() + datetime.timedelta(hours=TOKEN_LIFETIME_HOURS)).timestamp()
             }, current_app.config['SECRET_KEY'], algorithm="HS256")
 
-            # Lưu token vào Redis
-            redis_client.set(hash_pw_role[0], token)
-            
-            print(token)
-            print(redis_client.keys())
-
             ret = {
                     'status': True,
                     'message':'Login successfully!',
@@ -280,6 +396,12 @@ def login():
                         'status':False,
                         'message':'Username or password is incorrect!'
                         }), HTTP_400_BAD_REQUEST
+    except HasherBusy as e:
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        return jsonify(ret), HTTP_429_TOO_MANY_REQUESTS, {'Retry-After': '1'}
     except Exception as e:
         ret = {
             'status': False,
@@ -293,6 +415,54 @@ def login():
         if conn:
             conn.close()
 
+# DELETE
+@users.delete("/me")
+@swag_from("../docs/users/delete.yaml")
+@user_token_required
+def delete_user(user_id):
+    conn = None
+    cursor = None
+    try:
+        # Create connection
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        # Soft delete, the account keeps its sets and quizzes
+        cursor.execute(sql.SQL('''update public."user" set is_deleted = true, updated_at = %s
+                                  where id = %s and is_deleted is not true
+                                  returning email'''), (datetime.datetime.now(), user_id))
+        row = cursor.fetchone()
+        if row is None:
+            ret = {
+                    'status': False,
+                    'message':'This user has been deleted!'
+                }
+            return jsonify(ret), HTTP_400_BAD_REQUEST
+        conn.commit()
+
+        # Tokens issued before the deletion are rejected by every worker
+        forget_user(user_id, row[0])
+
+        ret = {
+                'status': True,
+                'message':'Delete account successfully!'
+            }
+        return jsonify(ret), HTTP_200_OK
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        ret = {
+            'status': False,
+            'message': str(e)
+        }
+        Systemp_log(traceback.format_exc(), "delete_user").append_new_line()
+        return jsonify(ret), HTTP_500_INTERNAL_SERVER_ERROR
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 # Hàm logout
 @users.post("/logout")
 @swag_from("../docs/users/logout.yaml")
@@ -302,12 +472,14 @@ def logout():
         if not token:
             return jsonify({'message': 'Token is missing!'}), HTTP_401_UNAUTHORIZED
 
-        # Giải mã token để lấy username
-        decoded_token = jwt.decode(token.split(' ')[1], current_app.config['SECRET_KEY'], algorithms=["HS256"])
-        email = decoded_token['email']
+        # Giải mã token để lấy jti và thời điểm hết hạn
+        token = token.split(' ')[1]
+        decoded_token = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
 
-        # Xóa token từ Redis
-        redis_client.delete(email)
+        # Đưa token vào denylist cho tới khi nó hết hạn
+        ttl = decoded_token['expiration'] - datetime.datetime.now().timestamp()
+        session_store.revoke(token_id(decoded_token, token), ttl)
+        forget_token(token)
 
         # Xóa session
         session.pop('logged_in', None)
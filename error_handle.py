@@ -1,21 +1,142 @@
+import atexit
 import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import g, has_request_context, request
+
+class LogWriter():
+    """Background writer for error logs.
+
+    Request threads only put a record on a bounded queue; one thread writes
+    the records in batches as JSON lines. Files are named log_yy_mm_dd (a new
+    file every day, the prefix can be changed) and rotated to .1, .2, ... when they grow
+    over max_bytes. When the queue is full new records are dropped and
+    counted instead of blocking the request.
+    """
+    def __init__(self, directory, max_bytes, backup_count, max_queue, batch_size, flush_interval, prefix='log_'):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+
+    def submit(self, record):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_thread(self):
+        # Restart the thread in worker processes forked after it was started
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _file_name(self):
+        return os.path.join(self.directory, self.prefix + datetime.datetime.now().strftime("%y_%m_%d"))
+
+    def _rotate(self, file_name):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{file_name}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{file_name}.{index + 1}')
+        os.replace(file_name, f'{file_name}.1')
+        self.rotations += 1
+
+    def _write(self, batch):
+        file_name = self._file_name()
+        lines = ''.join(json.dumps(record, ensure_ascii=False, default=str) + '\n' for record in batch)
+        try:
+            if os.path.exists(file_name) and os.path.getsize(file_name) + len(lines) > self.max_bytes:
+                self._rotate(file_name)
+            with open(file_name, 'a', encoding='utf-8') as file_object:
+                file_object.write(lines)
+            self.written += len(batch)
+        except OSError:
+            self.errors += 1
+
+    def flush(self, timeout=5):
+        """Wait (at most timeout seconds) until queued records are written."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'rotations': self.rotations,
+            'errors': self.errors
+        }
+
+log_writer = LogWriter(
+    directory=os.getenv('LOG_DIR', '.'),
+    max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+    max_queue=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+    batch_size=int(os.getenv('LOG_BATCH_SIZE', 200)),
+    flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 1))
+)
+atexit.register(log_writer.flush)
 
 class Systemp_log():
     def __init__(self,log_message,Name_error):
         self.log_message=log_message
         self.Name_error=Name_error
-        self.file_name='log_'+datetime.datetime.now().strftime("%y_%m_%d")
+        self.file_name=log_writer._file_name()
     def append_new_line(self):
-        """Append given text as a new line at the end of file"""
-        # Open the file in append & read mode ('a+')
-        with open(self.file_name, "a+") as file_object:
-            # Move read cursor to the start of file.
-            file_object.seek(0)
-            # If file is not empty then append '\n'
-            data = file_object.read(100)
-            if len(data) > 0:
-                file_object.write("\n")
-            # Append text at the end of file
-            file_object.writelines("-------------------Log----------------")
-            file_object.write(datetime.datetime.now().strftime("%y/%m/%d-%H:%M:%S") + '\n')
-            file_object.write(self.log_message+' ---- '+self.Name_error)
\ No newline at end of file
+        """Queue the log as a JSON record, it is written by the background log writer"""
+        record = {
+            'time': datetime.datetime.now().strftime("%y/%m/%d-%H:%M:%S"),
+            'name': self.Name_error,
+            'traceback': self.log_message
+        }
+
+        # Request information when the error happens while handling a request
+        if has_request_context():
+            record['endpoint'] = request.endpoint
+            record['method'] = request.method
+            record['path'] = request.path
+            record['user_id'] = g.get('user_id')
+            if 'request_started_at' in g:
+                record['latency_ms'] = round((time.perf_counter() - g.request_started_at) * 1000, 3)
+
+        log_writer.submit(record)
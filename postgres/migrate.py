@@ -0,0 +1,287 @@
+"""Versioned schema migrations.
+
+Base schema is postgres/queries/create_tables.sql, migrations in
+postgres/migrations are applied on top of it:
+
+    NNNN_name.up.sql     apply version NNNN
+    NNNN_name.down.sql   revert version NNNN
+
+Usage (from the project root):
+
+    python -m postgres.migrate status
+    python -m postgres.migrate up [--to VERSION]
+    python -m postgres.migrate down [--to VERSION]    (default: revert the last one)
+    python -m postgres.migrate check                  (report hot queries that still seq-scan)
+
+Each script runs in its own transaction. A script whose first line is
+
+    -- migrate: no-transaction
+
+runs in autocommit, one statement at a time, so it can build indexes with
+CREATE INDEX CONCURRENTLY: writes to the table go on during the build
+instead of waiting on its lock. Such a script is not atomic, every
+statement must be safe to run again (IF NOT EXISTS / IF EXISTS). A
+concurrent build that fails leaves an INVALID index that IF NOT EXISTS
+would skip: drop it before running the migration again.
+"""
+import argparse
+import datetime
+import json
+import os
+import re
+import sys
+
+from psycopg2 import sql
+
+from utils.database import create_connection
+from utils.guards import OWNERSHIP_QUERY
+from utils.queries import (USER_BY_EMAIL, users_page_query, SET_DOCUMENT, SET_DOCUMENT_JSON, SETS_PAGE, SETS_PAGE_JSON,
+                           questions_page_query, SET_QUESTION_SEQ, QUESTIONS_BY_ORDINAL, REMAINING_QUESTION_IDS)
+from utils.search import KEYWORD_FILTER, RELEVANCE_EXPRESSION
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Khóa advisory để hai tiến trình không chạy migration cùng lúc
+LOCK_ID = 74210001
+
+_FILE_PATTERN = re.compile(r'^(\d+)_(\w+)\.(up|down)\.sql$')
+
+def load_migrations():
+    """Return [(version, name, up_path, down_path)] sorted by version."""
+    found = {}
+    for file_name in os.listdir(MIGRATIONS_DIR):
+        match = _FILE_PATTERN.match(file_name)
+        if not match:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        entry = found.setdefault(version, {'name': name})
+        entry[direction] = os.path.join(MIGRATIONS_DIR, file_name)
+
+    migrations = []
+    for version in sorted(found):
+        entry = found[version]
+        if 'up' not in entry:
+            raise RuntimeError(f'Migration {version} has no up script!')
+        migrations.append((version, entry['name'], entry['up'], entry.get('down')))
+    return migrations
+
+def ensure_version_table(cursor):
+    cursor.execute('''create table if not exists public.schema_migrations (
+                        version INT PRIMARY KEY,
+                        name VARCHAR(200),
+                        applied_at TIMESTAMP DEFAULT now()
+                    )''')
+
+def applied_versions(cursor):
+    cursor.execute('select version from public.schema_migrations order by version')
+    return [item[0] for item in cursor.fetchall()]
+
+NO_TRANSACTION_MARKER = '-- migrate: no-transaction'
+
+def split_statements(script):
+    """Statements of an SQL script, split on the semicolons outside of quotes, $$ bodies and comments."""
+    statements = []
+    start = 0
+    position = 0
+    quote = None
+    while position < len(script):
+        char = script[position]
+        if quote is not None:
+            if script.startswith(quote, position):
+                position += len(quote)
+                quote = None
+                continue
+        elif script.startswith('--', position):
+            end = script.find('\n', position)
+            position = len(script) if end < 0 else end
+            continue
+        elif char in ('\'', '"'):
+            quote = char
+        elif char == '$':
+            match = re.match(r'\$\w*\$', script[position:])
+            if match:
+                quote = match.group(0)
+                position += len(quote)
+                continue
+        elif char == ';':
+            statements.append(script[start:position + 1])
+            start = position + 1
+        position += 1
+    statements.append(script[start:])
+    # Drop the pieces made only of comments and blank lines
+    return [statement.strip() for statement in statements
+            if any(line.strip() and not line.strip().startswith('--') for line in statement.splitlines())]
+
+def _read_script(path):
+    """(SQL text, True when the script must run outside of a transaction)."""
+    with open(path, encoding='utf-8') as file_object:
+        script = file_object.read()
+    return script, script.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+def _run_script(conn, cursor, path, record, params):
+    """Run one migration script, then record (or forget) its version."""
+    script, no_transaction = _read_script(path)
+    if not no_transaction:
+        # Mỗi migration chạy trong một transaction riêng
+        cursor.execute(script)
+        cursor.execute(record, params)
+        conn.commit()
+        return
+
+    # CREATE INDEX CONCURRENTLY không chạy được trong transaction: autocommit, từng câu một
+    # (kết thúc transaction đang mở, ví dụ câu đọc schema_migrations, trước khi đổi chế độ)
+    conn.commit()
+    conn.autocommit = True
+    try:
+        for statement in split_statements(script):
+            cursor.execute(statement)
+        cursor.execute(record, params)
+    finally:
+        conn.autocommit = False
+
+def migrate_up(conn, target=None):
+    cursor = conn.cursor()
+    applied = set(applied_versions(cursor))
+
+    for version, name, up_path, _ in load_migrations():
+        if version in applied or (target is not None and version > target):
+            continue
+        _run_script(conn, cursor, up_path, 'insert into public.schema_migrations (version, name) values (%s, %s)', (version, name))
+        print(f'Applied {version:04d}_{name}')
+    cursor.close()
+
+def migrate_down(conn, target=None):
+    cursor = conn.cursor()
+    applied = applied_versions(cursor)
+    migrations = {version: (name, down_path) for version, name, _, down_path in load_migrations()}
+
+    if target is None:
+        # Default: revert only the last applied migration
+        target = applied[-2] if len(applied) > 1 else 0
+
+    for version in reversed(applied):
+        if version <= target:
+            break
+        name, down_path = migrations.get(version, (None, None))
+        if down_path is None:
+            raise RuntimeError(f'Migration {version} can not be reverted (no down script)!')
+        _run_script(conn, cursor, down_path, 'delete from public.schema_migrations where version = %s', (version, ))
+        print(f'Reverted {version:04d}_{name}')
+    cursor.close()
+
+def print_status(conn):
+    cursor = conn.cursor()
+    applied = set(applied_versions(cursor))
+    for version, name, _, _ in load_migrations():
+        print(f"{'applied' if version in applied else 'pending':8} {version:04d}_{name}")
+    cursor.close()
+
+# Các query nóng của controller: chính các hằng số / hàm mà controller dùng, tham số mẫu lấy từ dữ liệu có sẵn
+HOT_QUERIES = {
+    'login / register (find_login_user)': USER_BY_EMAIL,
+    'users listing (get_users_infor)': users_page_query(['role = %(role)s']),
+    'ownership guard (utils/guards.py)': OWNERSHIP_QUERY,
+    'set document (load_set_document)': SET_DOCUMENT,
+    'set document as JSON (load_set_document_json)': SET_DOCUMENT_JSON,
+    'sets of a user (get_all_questions_of_all_sets)': SETS_PAGE,
+    'sets of a user as JSON (load_sets_page_json)': SETS_PAGE_JSON,
+    'questions of a set (fetch_questions_page)': questions_page_query('created_at', 'asc', keyset=True),
+    'keyword search by relevance (search)': questions_page_query('relevance', 'desc', RELEVANCE_EXPRESSION, [KEYWORD_FILTER]),
+    'question ordinals of a set (sample_question_ids)': SET_QUESTION_SEQ,
+    'quiz questions by ordinal (sample_question_ids)': QUESTIONS_BY_ORDINAL,
+    'remaining questions of a set (sample_question_ids fallback)': REMAINING_QUESTION_IDS,
+}
+
+def _sample_params(cursor):
+    cursor.execute('''select u.id, u.email, s.id, q.id, a.id
+                      from public.answer a
+                      join public.question q on q.id = a.question_id
+                      join public.set s on s.id = q.set_id
+                      join public."user" u on u.id = s.user_id
+                      limit 1''')
+    row = cursor.fetchone()
+    if row is None:
+        raise RuntimeError('Database has no data to build sample parameters, seed it first!')
+    return {
+        'user_id': str(row[0]),
+        'email': row[1],
+        'set_id': str(row[2]),
+        'question_id': str(row[3]),
+        'answer_id': str(row[4]),
+        'role': 1,
+        'keyword': 'hello',
+        'keyword_like': '%hello%',
+        'limit': 51,
+        'offset': 0,
+        'after_value': datetime.datetime(2000, 1, 1),
+        'after_id': str(row[3]),
+        'ordinals': [1, 2, 3],
+        'chosen': [str(row[3])]
+    }
+
+def _seq_scans(plan, found):
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        _seq_scans(child, found)
+    return found
+
+def check_plans(conn):
+    """EXPLAIN every hot query and report the tables it still reads with a sequential scan.
+
+    Plans are made with enable_seqscan off: a Seq Scan that survives means no
+    index can serve the query, whatever the table size is.
+    Return the number of queries with a sequential scan.
+    """
+    cursor = conn.cursor()
+    params = _sample_params(cursor)
+    cursor.execute('set local enable_seqscan = off')
+
+    failures = 0
+    for label, query in HOT_QUERIES.items():
+        cursor.execute(sql.SQL('explain (format json) ') + query, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables = sorted(set(_seq_scans(plan[0]['Plan'], [])))
+        if tables:
+            failures += 1
+            print(f'SEQ SCAN  {label}: {", ".join(tables)}')
+        else:
+            print(f'ok        {label}')
+
+    conn.rollback()
+    cursor.close()
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Database schema migrations')
+    parser.add_argument('command', choices=['status', 'up', 'down', 'check'])
+    parser.add_argument('--to', type=int, default=None, help='target version')
+    args = parser.parse_args(argv)
+
+    conn = create_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('select pg_advisory_lock(%s)', (LOCK_ID, ))
+        ensure_version_table(cursor)
+        conn.commit()
+
+        if args.command == 'status':
+            print_status(conn)
+        elif args.command == 'up':
+            migrate_up(conn, args.to)
+        elif args.command == 'down':
+            migrate_down(conn, args.to)
+        elif args.command == 'check':
+            return 1 if check_plans(conn) else 0
+        return 0
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.cursor().execute('select pg_advisory_unlock(%s)', (LOCK_ID, ))
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
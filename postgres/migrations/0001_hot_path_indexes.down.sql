@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS answer_question_id_idx;
+DROP INDEX CONCURRENTLY IF EXISTS question_set_id_idx;
+DROP INDEX CONCURRENTLY IF EXISTS answer_question_id_live_idx;
+DROP INDEX CONCURRENTLY IF EXISTS question_set_id_live_idx;
+DROP INDEX CONCURRENTLY IF EXISTS set_user_id_live_idx;
+DROP INDEX CONCURRENTLY IF EXISTS user_email_key;
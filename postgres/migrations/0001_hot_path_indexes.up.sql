@@ -0,0 +1,20 @@
+-- migrate: no-transaction
+-- Indexes for the lookups done on every request.
+-- Queries filter on is_deleted != true, which Postgres rewrites to NOT is_deleted,
+-- so the partial indexes below (is_deleted = false) can be used by them.
+
+-- Login, register and the email -> user id lookup of user_token_required
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS user_email_key ON "user" (email);
+
+-- Sets of a user, paginated by (created_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS set_user_id_live_idx ON "set" (user_id, created_at, id) WHERE is_deleted = false;
+
+-- Questions of a set, paginated by (created_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS question_set_id_live_idx ON question (set_id, created_at, id) WHERE is_deleted = false;
+
+-- Answers of a question
+CREATE INDEX CONCURRENTLY IF NOT EXISTS answer_question_id_live_idx ON answer (question_id, created_at, id) WHERE is_deleted = false;
+
+-- Foreign keys lookups that also need deleted rows
+CREATE INDEX CONCURRENTLY IF NOT EXISTS question_set_id_idx ON question (set_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS answer_question_id_idx ON answer (question_id);
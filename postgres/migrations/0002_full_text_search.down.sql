@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS answer_content_trgm_idx;
+DROP INDEX CONCURRENTLY IF EXISTS question_content_trgm_idx;
+DROP INDEX CONCURRENTLY IF EXISTS answer_search_vector_idx;
+DROP INDEX CONCURRENTLY IF EXISTS question_search_vector_idx;
+
+ALTER TABLE answer DROP COLUMN IF EXISTS search_vector;
+ALTER TABLE question DROP COLUMN IF EXISTS search_vector;
+
+DROP FUNCTION IF EXISTS public.f_unaccent(text);
@@ -0,0 +1,23 @@
+-- migrate: no-transaction
+-- Full-text and trigram search for question and answer content.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() is only STABLE, index expressions and generated columns need an IMMUTABLE wrapper
+CREATE OR REPLACE FUNCTION public.f_unaccent(text) RETURNS text
+	LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+	AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+-- 'simple' config: no stemming, so Vietnamese words are kept as they are (without diacritics)
+ALTER TABLE question ADD COLUMN IF NOT EXISTS search_vector tsvector
+	GENERATED ALWAYS AS (to_tsvector('simple', public.f_unaccent(coalesce(content, '')))) STORED;
+
+ALTER TABLE answer ADD COLUMN IF NOT EXISTS search_vector tsvector
+	GENERATED ALWAYS AS (to_tsvector('simple', public.f_unaccent(coalesce(content, '')))) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS question_search_vector_idx ON question USING gin (search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS answer_search_vector_idx ON answer USING gin (search_vector);
+
+-- Substring matches (LIKE '%kw%') on the unaccented, lower-cased content
+CREATE INDEX CONCURRENTLY IF NOT EXISTS question_content_trgm_idx ON question USING gin (public.f_unaccent(lower(content)) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS answer_content_trgm_idx ON answer USING gin (public.f_unaccent(lower(content)) gin_trgm_ops);
@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+DROP INDEX CONCURRENTLY IF EXISTS user_role_created_at_id_idx;
+DROP INDEX CONCURRENTLY IF EXISTS user_created_at_id_idx;
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Keyset pagination of GET /api/v1/users, ordered by (created_at, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_created_at_id_idx ON "user" (created_at, id);
+
+-- Same listing filtered by role
+CREATE INDEX CONCURRENTLY IF NOT EXISTS user_role_created_at_id_idx ON "user" (role, created_at, id);
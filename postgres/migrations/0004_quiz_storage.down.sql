@@ -0,0 +1,14 @@
+DROP INDEX IF EXISTS question_set_id_id_live_idx;
+DROP INDEX IF EXISTS quiz_user_id_idx;
+DROP INDEX IF EXISTS quiz_question_answer_user_set_idx;
+DROP INDEX IF EXISTS quiz_question_answer_quiz_id_key;
+
+-- Only the latest quiz of each (user_id, set_id) fits the old primary key
+DELETE FROM quiz_question_answer a
+USING quiz_question_answer b
+WHERE a.user_id = b.user_id AND a.set_id = b.set_id AND a.ctid < b.ctid;
+ALTER TABLE quiz_question_answer ADD PRIMARY KEY (user_id, set_id);
+ALTER TABLE quiz_question_answer DROP COLUMN IF EXISTS quiz_id;
+
+ALTER TABLE quiz DROP COLUMN IF EXISTS question_count;
+ALTER TABLE quiz DROP COLUMN IF EXISTS seed;
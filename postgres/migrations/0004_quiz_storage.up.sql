@@ -0,0 +1,15 @@
+-- migrate: no-transaction
+-- Generated quizzes: one quiz row per generation, its questions in quiz_question_answer.
+-- The (user_id, set_id) primary key allowed a single quiz per user and set, quizzes are keyed by quiz_id instead.
+ALTER TABLE quiz ADD COLUMN IF NOT EXISTS seed BIGINT;
+ALTER TABLE quiz ADD COLUMN IF NOT EXISTS question_count INT;
+
+ALTER TABLE quiz_question_answer ADD COLUMN IF NOT EXISTS quiz_id UUID REFERENCES quiz (id);
+ALTER TABLE quiz_question_answer DROP CONSTRAINT IF EXISTS quiz_question_answer_pkey;
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS quiz_question_answer_quiz_id_key ON quiz_question_answer (quiz_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS quiz_question_answer_user_set_idx ON quiz_question_answer (user_id, set_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS quiz_user_id_idx ON quiz (user_id, created_at, id) WHERE is_deleted = false;
+
+-- Random sampling counts the live questions of a set and picks them by rank in id order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS question_set_id_id_live_idx ON question (set_id, id) WHERE is_deleted = false;
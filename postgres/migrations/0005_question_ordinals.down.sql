@@ -0,0 +1,6 @@
+CREATE INDEX IF NOT EXISTS question_set_id_id_live_idx ON question (set_id, id) WHERE is_deleted = false;
+DROP INDEX IF EXISTS question_set_id_ordinal_live_idx;
+DROP TRIGGER IF EXISTS question_ordinal_trg ON question;
+DROP FUNCTION IF EXISTS public.f_question_ordinal();
+ALTER TABLE question DROP COLUMN IF EXISTS ordinal;
+ALTER TABLE "set" DROP COLUMN IF EXISTS question_seq;
@@ -0,0 +1,37 @@
+-- Dense ordinal of each question inside its set (1, 2, 3, ... in insertion order), never reused.
+-- Quiz sampling draws random ordinals and looks each one up on the index: every live question
+-- has the same chance and the cost depends on the number of questions drawn, not on the set size.
+ALTER TABLE "set" ADD COLUMN IF NOT EXISTS question_seq BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE question ADD COLUMN IF NOT EXISTS ordinal BIGINT;
+
+-- The counter lives on the set row: inserts into the same set take its row lock, so ordinals never collide
+CREATE OR REPLACE FUNCTION public.f_question_ordinal() RETURNS trigger
+	LANGUAGE plpgsql
+	AS $$
+BEGIN
+	UPDATE public.set SET question_seq = question_seq + 1 WHERE id = NEW.set_id
+	RETURNING question_seq INTO NEW.ordinal;
+	RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS question_ordinal_trg ON question;
+CREATE TRIGGER question_ordinal_trg BEFORE INSERT ON question
+	FOR EACH ROW EXECUTE FUNCTION public.f_question_ordinal();
+
+-- Existing questions, in creation order
+UPDATE question q
+SET ordinal = r.ordinal
+FROM (SELECT id, row_number() OVER (PARTITION BY set_id ORDER BY created_at, id) AS ordinal FROM question) r
+WHERE q.id = r.id AND q.ordinal IS NULL;
+
+UPDATE "set" s
+SET question_seq = m.max_ordinal
+FROM (SELECT set_id, max(ordinal) AS max_ordinal FROM question GROUP BY set_id) m
+WHERE s.id = m.set_id;
+
+-- Built inside the transaction: the backfill above already holds the row locks of every question,
+-- a concurrent build would not let writes through any earlier
+CREATE INDEX IF NOT EXISTS question_set_id_ordinal_live_idx ON question (set_id, ordinal) WHERE is_deleted = false;
+
+-- Replaced by the ordinal index, sampling no longer ranks the live questions in id order
+DROP INDEX IF EXISTS question_set_id_id_live_idx;
@@ -0,0 +1,115 @@
+from collections import OrderedDict
+import os
+import sys
+import threading
+import time
+
+def estimate_size(value):
+    """Rough memory size in bytes of a JSON-like value (dict / list / str / scalars)."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+class LRUCache():
+    """Thread-safe LRU cache bounded by an estimated memory size, with a TTL per entry."""
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (value, size, expires_at), oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=None, ttl=None):
+        if size is None:
+            size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            # Evict least recently used entries until the cache fits again
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key):
+        value, size, expires_at = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class SetDocumentCache():
+    """Assembled set documents keyed by (set id, version stamp).
+
+    The version stamp is read from the database (the same aggregate as the
+    ETag of the set: updated_at and live counts of the set, its questions
+    and its answers), so a write made by any worker gives the set a new
+    stamp and older documents are never served again. They are not looked
+    up anymore and age out of the LRU.
+    """
+    def __init__(self, max_bytes, ttl):
+        self.documents = LRUCache(max_bytes, ttl)
+
+    def get(self, set_id, version):
+        return self.documents.get((str(set_id), version))
+
+    def set(self, set_id, version, document):
+        self.documents.set((str(set_id), version), document)
+
+    def stats(self):
+        return self.documents.stats()
+
+set_document_cache = SetDocumentCache(
+    max_bytes=int(os.getenv('SET_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl=float(os.getenv('SET_CACHE_TTL', 300))
+)
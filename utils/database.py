@@ -1,16 +1,245 @@
 from dotenv import load_dotenv
+from collections import deque
+from flask import g, has_app_context
 import os
+import threading
+import time
 import psycopg2
+import psycopg2.extensions
+from utils.query_stats import query_stats
 
 # Tải các biến môi trường từ file .env
 load_dotenv()
 
-def get_db_connection():
-    conn = psycopg2.connect(
+def request_db_stats():
+    """[queries, seconds, connections opened] of the current request, None outside of a request."""
+    if not has_app_context():
+        return None
+    if 'db_stats' not in g:
+        g.db_stats = [0, 0.0, 0]
+    return g.db_stats
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that counts statements and their time for the current request,
+    and records every statement by fingerprint (see utils.query_stats)."""
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, None, time.perf_counter() - started, many=True)
+
+    def _record(self, query, vars, elapsed, many=False):
+        stats = request_db_stats()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += elapsed
+        query_stats.record(self, query, vars, elapsed, many)
+
+def create_connection():
+    return psycopg2.connect(
         host=os.getenv('DB_HOST'),
         database=os.getenv('DB_NAME'),
         user=os.getenv('DB_USER'),
         password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT')
+        port=os.getenv('DB_PORT'),
+        cursor_factory=InstrumentedCursor
     )
-    return conn
\ No newline at end of file
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool():
+    """Bounded pool of psycopg2 connections shared by all request threads."""
+    def __init__(self, minconn, maxconn, timeout, ping_interval):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        # Idle connections and the time they were returned to the pool
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+        # Counters for the health endpoint
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.opened = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def _open(self):
+        conn = create_connection()
+        self.opened += 1
+        stats = request_db_stats()
+        if stats is not None:
+            stats[2] += 1
+        return conn
+
+    def _is_alive(self, conn, idle_since):
+        """Pre-ping connections that have been idle for a while."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute('select 1')
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.monotonic()
+        conn = None
+
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        # Reserve a slot, the connect itself happens outside the lock
+                        self._size += 1
+                        idle_since = None
+                        break
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout('Database connection pool exhausted!')
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif not self._is_alive(conn, idle_since):
+                # Broken connection, replace it with a new one
+                self._close_quietly(conn)
+                self.reconnects += 1
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self.in_use += 1
+            self.checkouts += 1
+            self.checkout_time_total += elapsed
+            self.checkout_time_max = max(self.checkout_time_max, elapsed)
+        return conn
+
+    def putconn(self, conn):
+        # Never hand a connection with an open transaction to the next request
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._close_quietly(conn)
+
+        with self._cond:
+            self.in_use -= 1
+            if conn.closed or len(self._idle) >= self.maxconn:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def warm_up(self):
+        """Open minconn connections up front."""
+        with self._cond:
+            missing = self.minconn - self._size
+            self._size += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                continue
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'connections_opened': self.opened,
+                'reconnects': self.reconnects,
+                'timeouts': self.timeouts,
+                'checkout_latency_avg_ms': round(self.checkout_time_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'checkout_latency_max_ms': round(self.checkout_time_max * 1000, 3)
+            }
+
+class PooledConnection():
+    """Request-scoped handle on a pooled connection.
+
+    Controllers still call conn.close() in their finally blocks, so close() is
+    a no-op here; the connection goes back to the pool when the app context is
+    torn down.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+pool = ConnectionPool(
+    minconn=int(os.getenv('DB_POOL_MIN', 1)),
+    maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', 30))
+)
+
+def get_db_connection():
+    """Return the connection checked out for the current request."""
+    if 'db_conn' not in g:
+        g.db_conn = PooledConnection(pool.getconn())
+    return g.db_conn
+
+def release_db_connection(exception=None):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        pool.putconn(conn._conn)
+
+def init_app(app):
+    app.teardown_appcontext(release_db_connection)
+    try:
+        pool.warm_up()
+    except Exception as e:
+        print(f"Error warming up connection pool: {e}")
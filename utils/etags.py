@@ -0,0 +1,22 @@
+import hashlib
+from flask import request
+
+# Hậu tố được utils.compression thêm vào ETag của response đã nén
+ENCODING_SUFFIXES = ('', '-gzip', '-br')
+
+def strong_etag(*parts):
+    """Strong ETag (unquoted) of the values a representation depends on."""
+    text = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def matching_etag(etag):
+    """The variant of etag (plain or compressed) sent in If-None-Match, None if there is none."""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    if if_none_match.star_tag:
+        return etag
+    for suffix in ENCODING_SUFFIXES:
+        if if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+# Mã loại câu hỏi trong answer key (lưu gọn trong JSONB của quiz)
+TEXT_FILL = 't'
+CHOICE = 'c'
+
+_SPACES = re.compile(r'\s+')
+
+def normalize_answer_text(text):
+    """Text_Fill comparison form: NFC, case-folded, whitespace collapsed.
+
+    Diacritics are kept, in Vietnamese they change the word (ba / bà / bá).
+    """
+    if not isinstance(text, str):
+        return None
+    return _SPACES.sub(' ', unicodedata.normalize('NFC', text).casefold()).strip()
+
+def answer_key(question_type, answers):
+    """Compact key of one question from its answers in served order: [(content, is_correct), ...].
+
+    Multiple_Choice / Checkboxes: ['c', bitmask of the correct positions].
+    Text_Fill: ['t', normalized text of the correct answer].
+    """
+    if question_type == 'Text_Fill':
+        correct = [content for content, is_correct in answers if is_correct]
+        return [TEXT_FILL, normalize_answer_text(correct[0]) if correct else None]
+    mask = 0
+    for position, (content, is_correct) in enumerate(answers):
+        if is_correct:
+            mask |= 1 << position
+    return [CHOICE, mask]
+
+class QuizKey():
+    """Answer keys of a whole quiz packed for grading many submissions.
+
+    Every choice question gets a lane of lane_width bits in one integer:
+    the low bits are its answer positions, the top bit of the lane is a
+    guard that stays 0. A submission is packed the same way, XOR with the
+    packed key leaves a non-zero lane exactly for the wrong questions, and
+    adding 0b0111..1 to every lane carries into the guard bit of those lanes
+    only (SWAR), so all choice questions are checked with a few big-integer
+    operations whatever their number.
+    """
+    def __init__(self, stored_questions, keys):
+        self.question_ids = [question_id for question_id, _ in stored_questions]
+        self.total = len(self.question_ids)
+
+        choice_sizes = [len(answer_ids) for (question_id, answer_ids), (kind, _) in zip(stored_questions, keys) if kind == CHOICE]
+        self.lane_width = max(choice_sizes, default=0) + 1
+
+        # answer_id -> (question_id, bit in the packed integer)
+        self.answer_bits = {}
+        # question_id -> lane index of choice questions
+        self.lanes = {}
+        # question_id -> normalized text of Text_Fill questions
+        self.texts = {}
+
+        self.packed_key = 0
+        self.add_mask = 0
+        self.guard_mask = 0
+        width = self.lane_width
+        for (question_id, answer_ids), (kind, value) in zip(stored_questions, keys):
+            if kind == TEXT_FILL:
+                self.texts[question_id] = value
+                continue
+            lane = len(self.lanes)
+            offset = lane * width
+            self.lanes[question_id] = lane
+            for position, answer_id in enumerate(answer_ids):
+                self.answer_bits[answer_id] = (question_id, offset + position)
+            self.packed_key |= value << offset
+            self.add_mask |= ((1 << (width - 1)) - 1) << offset
+            self.guard_mask |= 1 << (offset + width - 1)
+
+    def grade(self, answers, detail=False):
+        """Score one submission {question_id: [answer ids] | text}.
+
+        Unanswered questions, unknown answer ids and answers given under
+        another question count as wrong. Return (score, ids of the correct
+        questions or None).
+        """
+        packed = 0
+        # Guard bits forced for lanes that are wrong whatever the XOR gives
+        forced_wrong = 0
+        text_correct = []
+
+        for question_id, value in answers.items():
+            lane = self.lanes.get(question_id)
+            if lane is not None:
+                if not isinstance(value, list):
+                    forced_wrong |= 1 << (lane * self.lane_width + self.lane_width - 1)
+                    continue
+                for answer_id in value:
+                    owner, bit = self.answer_bits.get(answer_id, (None, None))
+                    if owner != question_id:
+                        forced_wrong |= 1 << (lane * self.lane_width + self.lane_width - 1)
+                        break
+                    packed |= 1 << bit
+            elif question_id in self.texts:
+                expected = self.texts[question_id]
+                if expected is not None and normalize_answer_text(value) == expected:
+                    text_correct.append(question_id)
+
+        # Lanes of the wrong choice questions end up with their guard bit set
+        wrong = (((packed ^ self.packed_key) + self.add_mask) & self.guard_mask) | forced_wrong
+        score = len(self.lanes) - bin(wrong).count('1') + len(text_correct)
+
+        if not detail:
+            return score, None
+        correct = set(text_correct)
+        for question_id, lane in self.lanes.items():
+            if not (wrong >> (lane * self.lane_width + self.lane_width - 1)) & 1:
+                correct.add(question_id)
+        return score, [question_id for question_id in self.question_ids if question_id in correct]
+
+    def grade_batch(self, submissions, detail=False):
+        """[(score, correct ids or None), ...] of a list of submissions, graded one after the other."""
+        grade = self.grade
+        return [grade(answers, detail) for answers in submissions]
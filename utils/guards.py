@@ -0,0 +1,46 @@
+from typing import NamedTuple
+from psycopg2 import sql
+
+class Ownership(NamedTuple):
+    """Flags describing the user -> set -> question -> answer chain of a route."""
+    user_exists: bool
+    user_deleted: bool
+    set_exists: bool
+    set_deleted: bool
+    is_owner: bool
+    question_exists: bool
+    question_in_set: bool
+    question_deleted: bool
+    question_type: str
+    answer_in_question: bool
+    answer_deleted: bool
+
+# Mọi kiểm tra quyền sở hữu được gom vào một câu query duy nhất (tra theo khóa chính).
+# Nếu không truyền set_id thì set được suy ra từ question.
+OWNERSHIP_QUERY = sql.SQL('''select
+                                u.id is not null,
+                                coalesce(u.is_deleted, false),
+                                s.id is not null,
+                                coalesce(s.is_deleted, false),
+                                coalesce(s.user_id = u.id, false),
+                                q.id is not null,
+                                coalesce(q.set_id = s.id, false),
+                                coalesce(q.is_deleted, false),
+                                q.type,
+                                coalesce(a.question_id = q.id, false),
+                                coalesce(a.is_deleted, false)
+                            from (select 1) as x
+                            left join public."user" u on u.id = %(user_id)s::uuid
+                            left join public.question q on q.id = %(question_id)s::uuid
+                            left join public.set s on s.id = coalesce(%(set_id)s::uuid, q.set_id)
+                            left join public.answer a on a.id = %(answer_id)s::uuid''')
+
+def check_ownership(cursor, user_id, set_id=None, question_id=None, answer_id=None):
+    """Resolve the whole ownership chain of a route in one round trip."""
+    cursor.execute(OWNERSHIP_QUERY, {
+        'user_id': user_id,
+        'set_id': set_id,
+        'question_id': question_id,
+        'answer_id': answer_id
+    })
+    return Ownership(*cursor.fetchone())
@@ -0,0 +1,69 @@
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    """Values the controllers return that json cannot serialize (rows from psycopg2)."""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def stdlib_dumps(value, indent=None):
+    """UTF-8 JSON bytes with the standard library."""
+    separators = (',', ':') if indent is None else (',', ': ')
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=separators, indent=indent).encode('utf-8')
+
+def orjson_dumps(value, indent=None):
+    """UTF-8 JSON bytes with orjson (UUID, datetime and dataclasses are handled natively)."""
+    option = orjson.OPT_NON_STR_KEYS
+    if indent is not None:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(value, default=_default, option=option)
+
+# orjson khi đã cài, nếu không thì dùng thư viện chuẩn
+dumps_bytes = orjson_dumps if orjson is not None else stdlib_dumps
+
+class FastJSONProvider(JSONProvider):
+    """JSON provider of the app: orjson when it is installed, json otherwise.
+
+    Both produce the same output: compact UTF-8, keys in insertion order,
+    UUIDs as strings and dates / datetimes in ISO 8601. Responses are
+    written as bytes straight from the serializer.
+    """
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        # Options we do not know (cls, sort_keys, ...) go to the standard library
+        if kwargs:
+            kwargs.setdefault('default', _default)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if self._app.debug else None
+        return self._app.response_class(dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,131 @@
+import bisect
+
+from utils.shards import ThreadShards
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Shard():
+    """Counters written by a single thread only, so recording needs no lock."""
+    def __init__(self):
+        self.in_flight = 0
+        # (blueprint, endpoint, method, status) -> count
+        self.requests = {}
+        # (blueprint, endpoint) -> [bucket counts..., +Inf count, sum of seconds]
+        self.latency = {}
+        # (blueprint, endpoint) -> [queries, db seconds, connections opened]
+        self.db = {}
+
+    def merge(self, other):
+        """Add the counters of other, a shard no thread writes to anymore."""
+        self.in_flight += other.in_flight
+        for key, value in other.requests.items():
+            self.requests[key] = self.requests.get(key, 0) + value
+        for key, value in other.latency.items():
+            total = self.latency.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                total[index] += item
+        for key, value in other.db.items():
+            total = self.db.setdefault(key, [0, 0.0, 0])
+            for index, item in enumerate(value):
+                total[index] += item
+
+class Metrics():
+    """Per-endpoint request metrics rendered in the Prometheus text format.
+
+    Every thread records into its own shard; shards are only summed when
+    /metrics is scraped.
+    """
+    def __init__(self):
+        self._shards = ThreadShards(_Shard, _Shard.merge)
+
+    def _shard(self):
+        return self._shards.get()
+
+    def request_started(self):
+        self._shard().in_flight += 1
+
+    def request_finished(self, blueprint, endpoint, method, status, seconds, queries=0, db_seconds=0.0, connections_opened=0):
+        shard = self._shard()
+        shard.in_flight -= 1
+
+        key = (blueprint, endpoint, method, str(status))
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+
+        key = (blueprint, endpoint)
+        histogram = shard.latency.get(key)
+        if histogram is None:
+            histogram = shard.latency[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[-1] += seconds
+
+        db = shard.db.get(key)
+        if db is None:
+            db = shard.db[key] = [0, 0.0, 0]
+        db[0] += queries
+        db[1] += db_seconds
+        db[2] += connections_opened
+
+    def _collect(self):
+        total = _Shard()
+        for shard in self._shards.shards():
+            # The owner thread may add a key while we copy, copy again in that case
+            while True:
+                try:
+                    copy = _Shard()
+                    copy.in_flight = shard.in_flight
+                    copy.requests = dict(shard.requests)
+                    copy.latency = {key: list(value) for key, value in shard.latency.items()}
+                    copy.db = {key: list(value) for key, value in shard.db.items()}
+                    break
+                except RuntimeError:
+                    continue
+            total.merge(copy)
+        return total.in_flight, total.requests, total.latency, total.db
+
+    def render(self, gauges=None):
+        """Prometheus text exposition of all metrics, plus extra {name: value} gauges."""
+        in_flight, requests, latency, db = self._collect()
+        lines = []
+
+        lines.append('# HELP http_requests_in_flight Requests currently being handled.')
+        lines.append('# TYPE http_requests_in_flight gauge')
+        lines.append(f'http_requests_in_flight {in_flight}')
+
+        lines.append('# HELP http_requests_total Requests by endpoint and status code.')
+        lines.append('# TYPE http_requests_total counter')
+        for (blueprint, endpoint, method, status), value in sorted(requests.items()):
+            lines.append(f'http_requests_total{{blueprint="{blueprint}",endpoint="{endpoint}",method="{method}",status="{status}"}} {value}')
+
+        lines.append('# HELP http_request_duration_seconds Request latency by endpoint.')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for (blueprint, endpoint), value in sorted(latency.items()):
+            labels = f'blueprint="{blueprint}",endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += value[len(LATENCY_BUCKETS)]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {value[-1]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+        db_metrics = (
+            ('db_queries_total', 'Database statements executed by endpoint.', 0),
+            ('db_time_seconds_total', 'Time spent in database statements by endpoint.', 1),
+            ('db_connections_opened_total', 'New database connections opened while handling the endpoint.', 2),
+        )
+        for name, help_text, index in db_metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (blueprint, endpoint), value in sorted(db.items()):
+                number = f'{value[index]:.6f}' if index == 1 else value[index]
+                lines.append(f'{name}{{blueprint="{blueprint}",endpoint="{endpoint}"}} {number}')
+
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
@@ -0,0 +1,41 @@
+import base64
+import datetime
+import json
+import uuid
+
+class InvalidCursor(Exception):
+    pass
+
+def encode_cursor(sort_by, sort_value, last_id, sort_direction=None):
+    """Encode the position after the last returned row as an opaque string."""
+    if isinstance(sort_value, datetime.datetime):
+        value = {'t': 'dt', 'v': sort_value.isoformat()}
+    else:
+        value = {'t': 'raw', 'v': sort_value}
+
+    payload = {'s': sort_by, 'k': value, 'id': str(last_id)}
+    if sort_direction is not None:
+        payload['d'] = sort_direction
+    payload = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_by, sort_direction=None):
+    """Return (sort_value, last_id) of a cursor made by encode_cursor for the same sort column and direction."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+        if payload['s'] != sort_by:
+            raise InvalidCursor('Cursor does not match sort_by!')
+        if payload.get('d') != sort_direction:
+            raise InvalidCursor('Cursor does not match sort_direction!')
+
+        value = payload['k']['v']
+        if payload['k']['t'] == 'dt':
+            value = datetime.datetime.fromisoformat(value)
+
+        return value, str(uuid.UUID(payload['id']))
+    except InvalidCursor:
+        raise
+    except Exception:
+        raise InvalidCursor('Invalid cursor!')
@@ -0,0 +1,130 @@
+import concurrent.futures
+import os
+import threading
+import bcrypt
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued, the request should be retried later."""
+    pass
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _verify(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def hash_rounds(hashed):
+    """Cost factor of a bcrypt hash ($2b$12$...), None if it cannot be read."""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+class PasswordHasher():
+    """bcrypt on a bounded pool of worker processes.
+
+    bcrypt is slow on purpose and holds the CPU for the whole call, so it
+    runs outside of the request threads. At most max_pending calls can be
+    queued or running; past that hash() and verify() raise HasherBusy
+    right away instead of making every request wait. A call that does not
+    finish within timeout also raises HasherBusy, its job keeps its slot
+    until the worker is done with it. With workers = 0 the
+    calls run on the request thread (local runs, debugging).
+    """
+    def __init__(self, rounds, workers, max_pending, timeout):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_executor(self):
+        # Processes of the pool cannot be shared with a forked worker, create them again
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _run(self, function, *args):
+        if self.workers <= 0:
+            return function(*args)
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy('Too many login or register requests, please try again later!')
+            self._pending += 1
+        try:
+            future = self._get_executor().submit(function, *args)
+        except Exception:
+            self._release()
+            raise
+
+        # The slot is freed when the job ends, not when the request stops waiting for it
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            # Still queued: drop it; already running: it keeps its slot until it finishes
+            future.cancel()
+            self.count('timed_out')
+            raise HasherBusy('Password hashing is taking too long, please try again later!')
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+    def count(self, name):
+        """Add one to the counter name, request threads record concurrently."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def hash(self, password):
+        """bcrypt hash (str) of password with the configured cost factor."""
+        hashed = self._run(_hash, password.encode('utf-8'), self.rounds)
+        self.count('hashed')
+        return hashed
+
+    def verify(self, password, hashed):
+        result = self._run(_verify, password.encode('utf-8'), hashed.encode('utf-8'))
+        self.count('verified')
+        return result
+
+    def needs_rehash(self, hashed):
+        """True when the stored hash was made with another cost factor than the configured one."""
+        return hash_rounds(hashed) != self.rounds
+
+    def stats(self):
+        return {
+            'rounds': self.rounds,
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'hashed': self.hashed,
+            'verified': self.verified,
+            'rehashed': self.rehashed,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
+
+_workers = int(os.getenv('BCRYPT_WORKERS', os.cpu_count() or 2))
+
+password_hasher = PasswordHasher(
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 12)),
+    workers=_workers,
+    max_pending=int(os.getenv('BCRYPT_MAX_PENDING', max(_workers, 1) * 8)),
+    timeout=float(os.getenv('BCRYPT_TIMEOUT', 10))
+)
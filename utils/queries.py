@@ -0,0 +1,153 @@
+from psycopg2 import sql
+
+# SQL của các đường nóng, dùng chung bởi controller và `python -m postgres.migrate check`
+# (check EXPLAIN đúng các câu query mà app chạy). Tham số đều có tên.
+
+# Login / register: one lookup on the unique email index (user_email_key)
+USER_BY_EMAIL = sql.SQL('''select id, password, role, is_deleted from public."user" where email = %(email)s''')
+
+def where_clause(filters):
+    return ('where ' + ' and '.join(filters)) if filters else ''
+
+def users_page_query(filters):
+    """One keyset page of the user listing, filters are SQL conditions with named parameters."""
+    return sql.SQL('select id, email, name, role, is_deleted, created_at from public."user" '
+                   + where_clause(filters) + ' order by created_at, id limit %(limit)s')
+
+# Documents of the live questions (with their live answers) of the sets in the CTE "sets"
+QUESTION_DOCUMENTS_SQL = '''select b.set_id, b.id, b.created_at,
+                                   json_build_object(
+                                       'question_content', b.content,
+                                       'answers', json_agg(json_build_object('answer_content', c.content, 'is_correct', c.is_correct)
+                                                           order by c.created_at, c.id)
+                                   ) as document
+                            from public.question b
+                            join public.answer c
+                            on c.question_id = b.id and c.is_deleted != true
+                            where b.is_deleted != true and b.set_id in (select id from sets)
+                            group by b.id '''
+
+# Rows of the whole-set document, ordered by question then answer
+SET_DOCUMENT = sql.SQL('''select a.name, a.description, b.id, b.content, c.content, c.is_correct
+                          from public.set a
+                          join public.question b
+                          on a.id = b.set_id and b.set_id = %(set_id)s and b.is_deleted != true
+                          join public.answer c
+                          on b.id = c.question_id and c.is_deleted != true
+                          order by b.created_at, b.id, c.created_at, c.id''')
+
+# The same document as JSON text assembled by Postgres
+SET_DOCUMENT_JSON = sql.SQL('''with sets as (select id from public.set where id = %(set_id)s),
+                                questions as (''' + QUESTION_DOCUMENTS_SQL + ''')
+                                select json_build_object(
+                                           'name', s.name,
+                                           'description', s.description,
+                                           'questions', json_agg(q.document order by q.created_at, q.id)
+                                       )::text
+                                from public.set s
+                                join questions q
+                                on q.set_id = s.id
+                                group by s.id ''')
+
+# One page of sets of a user with all of their questions and answers in a single query.
+# "listed" reads one set past the page: the first column (has_more) tells whether another page follows.
+# Sets of the page are left joined so the page is never empty while has_more is true.
+SETS_PAGE = sql.SQL('''with listed as (
+                           select id, name, description, created_at
+                           from public.set
+                           where user_id = %(user_id)s and is_deleted != true
+                           order by created_at, id
+                           limit %(limit)s + 1 offset %(offset)s
+                       ),
+                       page as (
+                           select * from listed order by created_at, id limit %(limit)s
+                       )
+                       select (select count(*) from listed) > %(limit)s, p.id, p.name, p.description, b.id, b.content, c.content, c.is_correct
+                       from page p
+                       left join (public.question b
+                                  join public.answer c
+                                  on c.question_id = b.id and c.is_deleted != true)
+                       on b.set_id = p.id and b.is_deleted != true
+                       order by p.created_at, p.id, b.created_at, b.id, c.created_at, c.id''')
+
+# The same page as JSON text assembled by Postgres, with has_more
+SETS_PAGE_JSON = sql.SQL('''with listed as (
+                                select id, name, description, created_at
+                                from public.set
+                                where user_id = %(user_id)s and is_deleted != true
+                                order by created_at, id
+                                limit %(limit)s + 1 offset %(offset)s
+                            ),
+                            sets as (
+                                select * from listed order by created_at, id limit %(limit)s
+                            ),
+                            questions as (''' + QUESTION_DOCUMENTS_SQL + '''),
+                            documents as (
+                                select s.created_at, s.id,
+                                       json_build_object(
+                                           'name', s.name,
+                                           'description', s.description,
+                                           'questions', json_agg(q.document order by q.created_at, q.id)
+                                       ) as document
+                                from sets s
+                                join questions q
+                                on q.set_id = s.id
+                                group by s.created_at, s.id, s.name, s.description
+                            )
+                            select coalesce(json_agg(document order by created_at, id), '[]')::text,
+                                   (select count(*) from listed) > %(limit)s
+                            from documents ''')
+
+def questions_page_query(sort_by='created_at', sort_direction='asc', sort_expression=None, filters=None, keyset=False):
+    """One page of questions of %(set_id)s (with all of their answers), %(limit)s questions from %(offset)s.
+
+    filters are extra SQL conditions on b (question), sort_expression
+    replaces the sort column by an SQL expression (relevance). With keyset
+    the page starts after (%(after_value)s, %(after_id)s).
+    """
+    sort_order = sql.SQL('ASC') if sort_direction == 'asc' else sql.SQL('DESC')
+    sort_column = sql.SQL(sort_expression) if sort_expression else sql.Identifier('b', sort_by)
+
+    conditions = [sql.SQL('b.set_id = %(set_id)s'), sql.SQL('b.is_deleted != true')]
+    conditions.extend(sql.SQL(item) for item in (filters or []))
+
+    # Keyset condition: (sort column, question id) strictly after the cursor
+    if keyset:
+        conditions.append(sql.SQL('({}, b.id) {} (%(after_value)s, %(after_id)s::uuid)').format(
+            sort_column,
+            sql.SQL('>') if sort_direction == 'asc' else sql.SQL('<')
+        ))
+
+    return sql.SQL('''with page as (
+                          select b.id, b.content, {sort_column} as sort_value
+                          from public.question b
+                          where {conditions}
+                          order by {sort_column} {sort_order}, b.id {sort_order}
+                          limit %(limit)s offset %(offset)s
+                      )
+                      select a.name, a.description, p.id, p.content, p.sort_value, c.content, c.is_correct
+                      from public.set a
+                      left join page p on true
+                      left join public.answer c on c.question_id = p.id and c.is_deleted != true
+                      where a.id = %(set_id)s
+                      order by p.sort_value {sort_order}, p.id {sort_order}, c.created_at, c.id''').format(
+        sort_column=sort_column,
+        sort_order=sort_order,
+        conditions=sql.SQL(' and ').join(conditions)
+    )
+
+# Ordinal lớn nhất đã cấp trong set (migration 0005), tra theo khóa chính
+SET_QUESTION_SEQ = sql.SQL('''select question_seq from public.set where id = %(set_id)s''')
+
+# Câu hỏi sống có ordinal nằm trong các ordinal rút ngẫu nhiên, mỗi ordinal là một lần tra question_set_id_ordinal_live_idx
+QUESTIONS_BY_ORDINAL = sql.SQL('''select b.ordinal, b.id
+                                  from public.question b
+                                  where b.set_id = %(set_id)s and b.is_deleted = false
+                                  and b.ordinal = any(%(ordinals)s::bigint[])''')
+
+# Câu hỏi sống của set trừ các câu đã chọn (chỉ dùng khi phần lớn ordinal đã bị xóa)
+REMAINING_QUESTION_IDS = sql.SQL('''select b.id
+                                    from public.question b
+                                    where b.set_id = %(set_id)s and b.is_deleted = false
+                                    and b.id != all(%(chosen)s::uuid[])
+                                    order by b.ordinal''')
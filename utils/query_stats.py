@@ -0,0 +1,209 @@
+import atexit
+import datetime
+import json
+import os
+import random
+import re
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+
+from error_handle import LogWriter
+from utils.shards import ThreadShards
+
+# Số fingerprint giữ trong bộ nhớ đệm (câu SQL giống nhau được chuẩn hóa một lần)
+MAX_FINGERPRINT_CACHE = 2048
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES = re.compile(r'(values\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_SPACES = re.compile(r'\s+')
+
+_fingerprints = {}
+
+def fingerprint(statement):
+    """Statement with literals and parameters replaced by ?, lists collapsed and whitespace normalized.
+
+    select * from "set" where id = %s and name = 'a'  ->  select * from "set" where id = ? and name = ?
+    """
+    result = _fingerprints.get(statement)
+    if result is not None:
+        return result
+
+    result = _COMMENT.sub(' ', statement)
+    result = _STRING.sub('?', result)
+    result = _PLACEHOLDER.sub('?', result)
+    result = _NUMBER.sub('?', result)
+    result = _SPACES.sub(' ', result).strip().lower()
+    result = _LIST.sub('(...)', result)
+    result = _VALUES.sub(r'\1', result)
+
+    if len(_fingerprints) >= MAX_FINGERPRINT_CACHE:
+        _fingerprints.clear()
+    _fingerprints[statement] = result
+    return result
+
+def statement_text(cursor, query):
+    """SQL text of a query given as str, bytes or psycopg2.sql.Composable."""
+    if isinstance(query, sql.Composable):
+        return query.as_string(cursor)
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query
+
+def is_read_only(fingerprint_text):
+    """Only plain SELECTs are EXPLAIN ANALYZEd, ANALYZE runs the statement again."""
+    if not fingerprint_text.startswith(('select', 'with')):
+        return False
+    return not re.search(r'\b(insert|update|delete|merge|for update|for share)\b', fingerprint_text)
+
+class _Shard():
+    """Statistics written by a single thread only, so recording needs no lock."""
+    def __init__(self):
+        # fingerprint -> [calls, total seconds, max seconds, rows]
+        self.statements = {}
+
+    def merge(self, other):
+        """Add the statistics of other, a shard no thread writes to anymore."""
+        for key, (calls, seconds, max_seconds, rows) in other.statements.items():
+            total = self.statements.setdefault(key, [0, 0.0, 0.0, 0])
+            total[0] += calls
+            total[1] += seconds
+            total[2] = max(total[2], max_seconds)
+            total[3] += rows
+
+class QueryStats():
+    """Per-statement statistics, aggregated by fingerprint.
+
+    Statements slower than slow_ms are written to the slow-query log; a
+    sample (explain_sample, 0..1) of the slow SELECTs is run again under
+    EXPLAIN (ANALYZE, BUFFERS) and the plan is written with them.
+    """
+    def __init__(self, slow_ms, explain_sample, slow_log):
+        self.slow_ms = slow_ms
+        self.explain_sample = explain_sample
+        self.slow_log = slow_log
+
+        self._shards = ThreadShards(_Shard, _Shard.merge)
+
+        self.slow_statements = 0
+        self.explained = 0
+        self.explain_errors = 0
+
+    def _shard(self):
+        return self._shards.get()
+
+    def record(self, cursor, query, vars, elapsed, many=False):
+        text = statement_text(cursor, query)
+        key = fingerprint(text)
+
+        statements = self._shard().statements
+        entry = statements.get(key)
+        if entry is None:
+            entry = statements[key] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        if elapsed > entry[2]:
+            entry[2] = elapsed
+        if cursor.rowcount > 0:
+            entry[3] += cursor.rowcount
+
+        if elapsed * 1000 >= self.slow_ms:
+            self._log_slow(cursor, text, key, vars, elapsed, many)
+
+    def _log_slow(self, cursor, text, key, vars, elapsed, many):
+        self.slow_statements += 1
+        record = {
+            'time': datetime.datetime.now().strftime("%y/%m/%d-%H:%M:%S"),
+            'duration_ms': round(elapsed * 1000, 3),
+            'fingerprint': key,
+            'rows': cursor.rowcount
+        }
+
+        # Server-side cursors keep their portal open, executemany has no single plan
+        if (not many and cursor.name is None and self.explain_sample > 0
+                and is_read_only(key) and random.random() < self.explain_sample):
+            record['plan'] = self._explain(cursor.connection, text, vars)
+
+        self.slow_log.submit(record)
+
+    def _explain(self, conn, text, vars):
+        # Chạy trong savepoint để lỗi của EXPLAIN không hủy transaction của request
+        cursor = psycopg2.extensions.cursor(conn)
+        try:
+            cursor.execute('SAVEPOINT query_stats_explain')
+            try:
+                cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + text, vars)
+                plan = cursor.fetchone()[0]
+                cursor.execute('RELEASE SAVEPOINT query_stats_explain')
+                self.explained += 1
+                return plan if not isinstance(plan, str) else json.loads(plan)
+            except psycopg2.Error:
+                cursor.execute('ROLLBACK TO SAVEPOINT query_stats_explain')
+                self.explain_errors += 1
+                return None
+        except psycopg2.Error:
+            self.explain_errors += 1
+            return None
+        finally:
+            cursor.close()
+
+    def _collect(self):
+        total = _Shard()
+        for shard in self._shards.shards():
+            # The owner thread may add a key while we copy, copy again in that case
+            while True:
+                try:
+                    copy = _Shard()
+                    copy.statements = {key: list(value) for key, value in shard.statements.items()}
+                    break
+                except RuntimeError:
+                    continue
+            total.merge(copy)
+        return total.statements
+
+    def top(self, limit=20, order_by='total_ms'):
+        """Statements with the highest total (or max / mean) time first."""
+        result = []
+        for key, (calls, seconds, max_seconds, rows) in self._collect().items():
+            result.append({
+                'fingerprint': key,
+                'calls': calls,
+                'total_ms': round(seconds * 1000, 3),
+                'mean_ms': round(seconds * 1000 / calls, 3),
+                'max_ms': round(max_seconds * 1000, 3),
+                'rows': rows
+            })
+        if order_by not in ('total_ms', 'mean_ms', 'max_ms', 'calls', 'rows'):
+            order_by = 'total_ms'
+        result.sort(key=lambda item: item[order_by], reverse=True)
+        return result[:limit]
+
+    def stats(self):
+        return {
+            'fingerprints': len(self._collect()),
+            'slow_ms': self.slow_ms,
+            'slow_statements': self.slow_statements,
+            'explain_sample': self.explain_sample,
+            'explained': self.explained,
+            'explain_errors': self.explain_errors
+        }
+
+query_stats = QueryStats(
+    slow_ms=float(os.getenv('SLOW_QUERY_MS', 200)),
+    explain_sample=float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', 0)),
+    slow_log=LogWriter(
+        directory=os.getenv('LOG_DIR', '.'),
+        max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+        max_queue=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+        batch_size=int(os.getenv('LOG_BATCH_SIZE', 200)),
+        flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', 1)),
+        prefix='slow_query_'
+    )
+)
+atexit.register(query_stats.slow_log.flush)
@@ -0,0 +1,15 @@
+import json
+import os
+from flask import Response
+
+# Set documents are assembled by Postgres (json_agg) instead of Python when enabled
+SET_JSON_FROM_DB = os.getenv('SET_JSON_FROM_DB', 'false').lower() == 'true'
+
+def raw_json_response(fields, data_json, status=200):
+    """JSON response {**fields, "data": <data_json>} where data_json is JSON text built by the database.
+
+    The text is copied into the body as it is, it is never parsed or serialized again.
+    """
+    head = json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+    body = head[:-1] + (',"data":' if fields else '"data":') + data_json + '}'
+    return Response(body.encode('utf-8'), status=status, mimetype='application/json')
@@ -0,0 +1,78 @@
+import re
+import unicodedata
+
+# Điều kiện tìm kiếm dùng các cột/index trong postgres/migrations/0002_full_text_search.up.sql.
+# Câu hỏi khớp nếu nội dung của nó hoặc của một đáp án (chưa bị xóa) khớp với keyword,
+# theo full-text (search_vector) hoặc theo chuỗi con (index trigram).
+# Đáp án được kiểm tra bằng EXISTS tương quan: chỉ đọc đáp án của câu hỏi đang xét trong set,
+# không phải tập đáp án khớp keyword của mọi set.
+KEYWORD_FILTER = '''(b.search_vector @@ plainto_tsquery('simple', public.f_unaccent(%(keyword)s))
+                     OR public.f_unaccent(lower(b.content)) LIKE %(keyword_like)s
+                     OR EXISTS (SELECT 1 FROM public.answer c2
+                                WHERE c2.question_id = b.id AND c2.is_deleted != true
+                                AND (c2.search_vector @@ plainto_tsquery('simple', public.f_unaccent(%(keyword)s))
+                                     OR public.f_unaccent(lower(c2.content)) LIKE %(keyword_like)s)))'''
+
+# Điểm liên quan: điểm của câu hỏi cộng điểm cao nhất trong các đáp án
+# ts_rank trả về real (float4): ép sang float8 để giá trị trong cursor (float của Python) so sánh đúng độ chính xác
+RELEVANCE_EXPRESSION = '''((ts_rank(b.search_vector, plainto_tsquery('simple', public.f_unaccent(%(keyword)s)))
+                           + coalesce((SELECT max(ts_rank(c3.search_vector, plainto_tsquery('simple', public.f_unaccent(%(keyword)s))))
+                                       FROM public.answer c3
+                                       WHERE c3.question_id = b.id AND c3.is_deleted != true), 0))::float8)'''
+
+def normalize_text(text):
+    """Lower-case text and strip Vietnamese diacritics (the same idea as f_unaccent(lower(...)))."""
+    return ''.join(_normalize_char(char) for char in text)
+
+def _normalize_char(char):
+    char = char.lower()
+    if char == 'đ':
+        return 'd'
+    decomposed = unicodedata.normalize('NFD', char)
+    stripped = ''.join(item for item in decomposed if not unicodedata.combining(item))
+    return stripped or char
+
+def keyword_params(keyword):
+    """Query parameters used by KEYWORD_FILTER and RELEVANCE_EXPRESSION."""
+    escaped = re.sub(r'([\\%_])', r'\\\1', normalize_text(keyword))
+    return {
+        'keyword': keyword,
+        'keyword_like': f'%{escaped}%'
+    }
+
+def highlight(text, keyword, start='<mark>', stop='</mark>'):
+    """Wrap every match of the keyword (or of its words) in text, ignoring case and diacritics."""
+    if not text or not keyword:
+        return text
+
+    # Mỗi ký tự gốc được chuẩn hóa thành đúng một ký tự nên vị trí trong hai chuỗi trùng nhau
+    normalized = ''.join(_normalize_char(char)[:1] or char for char in text)
+
+    terms = [normalize_text(keyword)] + normalize_text(keyword).split()
+    spans = []
+    for term in terms:
+        if not term:
+            continue
+        for match in re.finditer(re.escape(term), normalized):
+            spans.append((match.start(), match.end()))
+
+    if not spans:
+        return text
+
+    # Merge overlapping spans
+    spans.sort()
+    merged = [list(spans[0])]
+    for begin, end in spans[1:]:
+        if begin <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([begin, end])
+
+    result = []
+    position = 0
+    for begin, end in merged:
+        result.append(text[position:begin])
+        result.append(start + text[begin:end] + stop)
+        position = end
+    result.append(text[position:])
+    return ''.join(result)
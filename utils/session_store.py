@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+class SessionStore():
+    """Denylist of revoked tokens keyed by token id (jti), and of deleted users.
+
+    Every entry expires with the token it revokes, so the store only holds
+    tokens that could still be used. Lookups are a single key check.
+    """
+    def __init__(self, client, prefix='revoked:', user_prefix='deleted_user:'):
+        self.client = client
+        self.prefix = prefix
+        self.user_prefix = user_prefix
+
+    def revoke(self, token_id, ttl):
+        # An expired token is rejected anyway, keep at least one second
+        self.client.set(self.prefix + token_id, 1, ex=max(int(ttl), 1))
+
+    def is_revoked(self, token_id):
+        return self.client.exists(self.prefix + token_id) == 1
+
+    def revoke_user(self, user_id, ttl):
+        """All tokens of a deleted user, ttl is the lifetime of the last token issued to them."""
+        self.client.set(self.user_prefix + str(user_id), 1, ex=max(int(ttl), 1))
+
+    def is_user_revoked(self, user_id):
+        return self.client.exists(self.user_prefix + str(user_id)) == 1
+
+def token_id(payload, token):
+    """jti claim of the token, or a hash of the token for tokens issued without one."""
+    if payload.get('jti'):
+        return payload['jti']
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def create_session_store():
+    """Redis shared by all workers when REDIS_URL is set, else an in-process stand-in (tests, local runs)."""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        import redis
+        return SessionStore(redis.Redis.from_url(redis_url))
+
+    from fakeredis import FakeStrictRedis
+    return SessionStore(FakeStrictRedis())
+
+session_store = create_session_store()
@@ -0,0 +1,58 @@
+import threading
+import weakref
+
+class _Sentinel():
+    """Lives in the thread-local storage of one thread, collected when the thread ends."""
+
+class ThreadShards():
+    """One shard per thread, so the owner thread records without a lock.
+
+    When a thread ends, its shard is merged into a shard of retired totals
+    and dropped, so threads started per request (Werkzeug threaded server)
+    do not leave a shard behind each. The retired shard is replaced rather
+    than updated, readers always see each count exactly once.
+
+    factory() makes an empty shard, merge(into, shard) adds shard to into.
+    """
+    def __init__(self, factory, merge):
+        self._factory = factory
+        self._merge = merge
+        self._local = threading.local()
+        # id(sentinel) -> shard of the live threads
+        self._live = {}
+        self._retired = factory()
+        self._lock = threading.Lock()
+
+    def get(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._factory()
+            sentinel = _Sentinel()
+            self._local.shard = shard
+            self._local.sentinel = sentinel
+            key = id(sentinel)
+            # Lock only the first time a thread records something
+            with self._lock:
+                self._live[key] = shard
+            weakref.finalize(sentinel, self._retire, key)
+        return shard
+
+    def _retire(self, key):
+        with self._lock:
+            shard = self._live.get(key)
+            if shard is None:
+                return
+            retired = self._factory()
+            self._merge(retired, self._retired)
+            self._merge(retired, shard)
+            self._retired = retired
+            del self._live[key]
+
+    def shards(self):
+        """Shards of the live threads plus the retired totals."""
+        with self._lock:
+            return list(self._live.values()) + [self._retired]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._live)
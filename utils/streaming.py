@@ -0,0 +1,40 @@
+import uuid
+from flask import Response, stream_with_context
+from utils.json_provider import dumps_bytes
+from utils.database import pool
+
+# Số dòng lấy từ server-side cursor mỗi lần
+DEFAULT_BATCH_SIZE = 500
+
+def iter_server_side(query, params=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield the rows of query from a named (server-side) cursor, batch_size rows at a time.
+
+    Only one batch is held in memory, whatever the size of the result.
+    The body of a streamed response is iterated after the app context has
+    released the request's connection (g.db_conn), so the generator checks
+    out its own connection when it starts and gives it back when it ends.
+    """
+    conn = pool.getconn()
+    cursor = None
+    try:
+        cursor = conn.cursor(name=f'stream_{uuid.uuid4().hex}')
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        if cursor is not None:
+            cursor.close()
+        pool.putconn(conn)
+
+def to_ndjson_line(item):
+    return dumps_bytes(item) + b'\n'
+
+def ndjson_response(items):
+    """Stream an iterable of dicts as newline-delimited JSON (one object per line)."""
+    lines = (to_ndjson_line(item) for item in items)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')